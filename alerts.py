@@ -0,0 +1,159 @@
+import heapq
+import threading
+import time
+
+def direction(typ):
+    return 1 if typ.endswith("BUY") else -1
+
+def strength(typ):
+    return 2 if typ.startswith("ULTRA") else 1
+
+class AlertEngine:
+    """
+    Alert deduplication per (chat, symbol, interval). An alert opens a state (type,
+    score, cooldown end); while it lasts the pair only alerts again on a transition:
+    a flip (BUY <-> SELL) or an escalation (BUY -> ULTRA BUY) whose score beats the
+    alerted one by `hysteresis`. Repeats and weakening signals are suppressed.
+
+    Cooldown ends sit in a heap (lazy deletion: re-alerting pushes a new entry and
+    the stale one is skipped), so expired states are dropped as time passes and only
+    pairs in cooldown are held. State is persisted to `store` namespace `ns` in
+    batches: flush() (end of a sweep) or at most every `flush_interval` seconds.
+    reset_chat() bumps the namespace's version, so the scanner process picks up a
+    reset made in a web worker on its next sync().
+    """
+    def __init__(self, store=None, ns="last_signals", hysteresis=1, flush_interval=5.0, default_cooldown=1200):
+        self.store = store
+        self.ns = ns
+        self.hysteresis = hysteresis
+        self.flush_interval = flush_interval
+        self.active = {}      # key -> [type, score, sent_at, until]
+        self.heap = []        # (until, key)
+        self.dirty = set()
+        self.removed = set()
+        self.flushed = time.time()
+        self.default_cooldown = default_cooldown
+        self.version = None
+        self.lock = threading.Lock()
+        self.stats = {"sent": 0, "suppressed": 0, "flips": 0, "escalations": 0, "expired": 0, "flushes": 0}
+        if store is not None:
+            self.version = store.version(ns)
+            self._load()
+
+    @staticmethod
+    def key(chat_id, symbol, interval):
+        return f"{chat_id}:{symbol}_{interval}"
+
+    def _load(self):
+        now = time.time()
+        for key, rec in self.store.items(self.ns).items():
+            if isinstance(rec, dict):
+                st = [rec.get("type"), rec.get("score", 0), rec.get("ts", 0), rec.get("until", 0)]
+            else:
+                # bare send timestamp from before alert states were kept
+                st = [None, 0, rec, rec + self.default_cooldown]
+            if st[3] <= now:
+                self.removed.add(key)
+                continue
+            self.active[key] = st
+            self.heap.append((st[3], key))
+        heapq.heapify(self.heap)
+
+    def _expire_locked(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            until, key = heapq.heappop(heap)
+            st = self.active.get(key)
+            if st is not None and st[3] == until:
+                del self.active[key]
+                self.dirty.discard(key)
+                self.removed.add(key)
+                self.stats["expired"] += 1
+
+    def decide(self, chat_id, symbol, interval, typ, score, cooldown, now=None):
+        """
+        True if the alert should go out (its state is then recorded), False if it is
+        suppressed. `typ` is an alert type (ULTRA BUY/BUY/SELL/ULTRA SELL).
+        """
+        now = time.time() if now is None else now
+        key = self.key(chat_id, symbol, interval)
+        with self.lock:
+            self._expire_locked(now)
+            st = self.active.get(key)
+            if st is not None:
+                if st[0] is not None and direction(typ) != direction(st[0]):
+                    self.stats["flips"] += 1
+                elif (st[0] is not None and strength(typ) > strength(st[0])
+                      and direction(typ) * (score - st[1]) >= self.hysteresis):
+                    self.stats["escalations"] += 1
+                else:
+                    self.stats["suppressed"] += 1
+                    return False
+            until = now + cooldown
+            self.active[key] = [typ, score, now, until]
+            heapq.heappush(self.heap, (until, key))
+            self.dirty.add(key)
+            self.removed.discard(key)
+            self.stats["sent"] += 1
+            due = self.store is not None and now - self.flushed >= self.flush_interval
+        if due:
+            self.flush()
+        return True
+
+    def reset_chat(self, chat_id):
+        """Forget a chat's alert states."""
+        prefix = f"{chat_id}:"
+        with self.lock:
+            for key in [k for k in self.active if k.startswith(prefix)]:
+                del self.active[key]
+                self.dirty.discard(key)
+                self.removed.add(key)
+        self.flush()
+        if self.store is not None:
+            self.store.bump(self.ns)
+
+    def sync(self):
+        """
+        Reload the states if another process reset some (stored version moved).
+        Unflushed local states are written first and kept. True if reloaded.
+        """
+        if self.store is None:
+            return False
+        version = self.store.version(self.ns)
+        if version == self.version:
+            return False
+        self.flush()
+        with self.lock:
+            keep = {k: self.active[k] for k in self.dirty}
+            self.active, self.heap = {}, []
+            self.version = version
+            self._load()
+            for key, st in keep.items():
+                self.active[key] = st
+                heapq.heappush(self.heap, (st[3], key))
+        return True
+
+    def flush(self):
+        """Write changed states and drop expired ones from the store."""
+        with self.lock:
+            self._expire_locked(time.time())
+            dirty = {k: dict(zip(("type", "score", "ts", "until"), self.active[k])) for k in self.dirty}
+            removed = list(self.removed)
+            self.dirty, self.removed = set(), set()
+            self.flushed = time.time()
+        if self.store is None or not (dirty or removed):
+            return
+        try:
+            if dirty:
+                self.store.put_many(self.ns, dirty)
+            if removed:
+                self.store.delete_many(self.ns, removed)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            print("Alert state flush error:", e)
+            with self.lock:
+                self.dirty.update(k for k in dirty if k in self.active)
+                self.removed.update(k for k in removed if k not in self.active)
+
+    def __len__(self):
+        return len(self.active)
@@ -0,0 +1,199 @@
+"""
+Offline backtest of the combined RSI/MACD/EMA scoring.
+
+    python backtest.py --archive klines --interval 15m [--symbols BTCUSDT,ETHUSDT]
+    python backtest.py --file candles.json --interval 1m \\
+        --grid "rsi_buy=20,25,30;rsi_sell=70,75,80;signal_validity_min=15,30"
+
+Candles come from a KlineArchive directory or a JSON file ({"BTCUSDT_1m": [[open_time,
+o, h, l, c, v], ...]}). Every candle close is scored with the same thresholds as the
+live bot and alerts go through the same AlertEngine (cooldown, flips, escalation
+hysteresis) as send_signal_if_new. Sentiment is not replayed (counts as neutral). For each signal
+type the report shows the count, the hit rate (price moved in the signal's direction)
+and the mean forward return after each horizon. Series are spread over a process pool.
+--rules scores with a pipeline.py rules file (SCORING_RULES) instead of the built-in rules.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from alerts import AlertEngine
+from indicators import SIGNAL_CODES, indicator_history, score_arrays, signal_types
+from kline_store import INTERVAL_MS
+from pipeline import Scorer
+
+DEFAULT_PARAMS = {"rsi_buy": 25, "rsi_sell": 75, "signal_validity_min": 20, "alert_hysteresis": 1}
+MIN_HISTORY = 50  # candles before the first scored close
+
+def parse_grid(text):
+    """'rsi_buy=20,25;rsi_sell=75' -> list of param dicts (cartesian product)."""
+    axes = {}
+    for part in filter(None, (p.strip() for p in (text or "").split(";"))):
+        name, values = part.split("=", 1)
+        axes[name.strip()] = [float(v) if "." in v else int(v) for v in values.split(",")]
+    names = list(axes)
+    combos = []
+    for values in itertools.product(*(axes[n] for n in names)):
+        params = dict(DEFAULT_PARAMS)
+        params.update(zip(names, values))
+        combos.append(params)
+    return combos or [dict(DEFAULT_PARAMS)]
+
+def apply_cooldown(idx, close_times, cooldown_s, codes, scores, hysteresis=1):
+    """Indices that would be sent, decided by an AlertEngine like send_signal_if_new."""
+    engine = AlertEngine(hysteresis=hysteresis)
+    return [i for i in idx.tolist()
+            if engine.decide(0, "", "", SIGNAL_CODES[int(codes[i])], int(scores[i]), cooldown_s,
+                             close_times[i] / 1000.0)]
+
+def backtest_series(open_time, closes, interval, combos, horizons, rules=None, cols=None):
+    """
+    Run every param combo over one series. Returns, per combo, {signal type:
+    {"n": count, "hits": [per horizon], "ret_sum": [per horizon]}}.
+    With `rules`, scores come from a pipeline Scorer over `cols` (OHLCV arrays).
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    close_times = np.asarray(open_time, dtype=np.int64) + INTERVAL_MS[interval]
+    if rules:
+        scorer = Scorer(rules)
+        hist = scorer.history(cols or {"close": closes})
+    else:
+        hist = indicator_history(closes)
+    n = len(closes)
+    # forward returns per horizon, NaN where the future is not in the data
+    fwd = np.full((len(horizons), n), np.nan)
+    for h_i, h in enumerate(horizons):
+        if h < n:
+            fwd[h_i, :n - h] = closes[h:] / closes[:n - h] - 1
+    results = []
+    for params in combos:
+        if rules:
+            score = scorer.score_arrays(hist, params)
+        else:
+            score = score_arrays(hist["rsi"], hist["macd"], hist["macd_signal"], hist["ema50"], closes,
+                                 params["rsi_buy"], params["rsi_sell"])
+        codes = signal_types(score)
+        codes[:MIN_HISTORY] = 0
+        sent = apply_cooldown(np.flatnonzero(codes), close_times, params["signal_validity_min"] * 60,
+                              codes, score, params["alert_hysteresis"])
+        stats = {}
+        for i in sent:
+            code = int(codes[i])
+            st = stats.setdefault(SIGNAL_CODES[code], {"n": 0, "hits": [0] * len(horizons),
+                                                       "ret_sum": [0.0] * len(horizons),
+                                                       "ret_n": [0] * len(horizons)})
+            st["n"] += 1
+            for h_i in range(len(horizons)):
+                r = fwd[h_i, i]
+                if np.isnan(r):
+                    continue
+                st["ret_n"][h_i] += 1
+                st["ret_sum"][h_i] += float(r)
+                if (r > 0) == (code > 0) and r != 0:
+                    st["hits"][h_i] += 1
+        results.append(stats)
+    return results
+
+def _run_job(job):
+    source, symbol, interval, combos, horizons, rules = job
+    if source[0] == "archive":
+        from kline_archive import KlineArchive
+        fields = ("open_time", "open", "high", "low", "close", "volume") if rules else ("open_time", "close")
+        snap = KlineArchive(source[1]).read(symbol, interval, None, fields)
+        if snap is None:
+            return symbol, None
+        open_time, closes = snap["open_time"], snap["close"]
+        cols = snap if rules else None
+    else:
+        rows = source[1]
+        open_time = [int(r[0]) for r in rows]
+        closes = [float(r[4]) for r in rows]
+        cols = {name: [float(r[i]) for r in rows]
+                for i, name in enumerate(("open", "high", "low", "close", "volume"), start=1)} if rules else None
+    if len(closes) <= MIN_HISTORY:
+        return symbol, None
+    return symbol, backtest_series(open_time, closes, interval, combos, horizons, rules, cols)
+
+def merge_stats(into, stats):
+    for typ, st in stats.items():
+        acc = into.setdefault(typ, {"n": 0, "hits": [0] * len(st["hits"]),
+                                    "ret_sum": [0.0] * len(st["hits"]), "ret_n": [0] * len(st["hits"])})
+        acc["n"] += st["n"]
+        for k in ("hits", "ret_sum", "ret_n"):
+            acc[k] = [a + b for a, b in zip(acc[k], st[k])]
+
+def run(jobs, combos, workers=None):
+    """Run jobs on a process pool and return the merged stats per combo."""
+    totals = [{} for _ in combos]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for symbol, res in pool.map(_run_job, jobs):
+            if res is None:
+                continue
+            for acc, stats in zip(totals, res):
+                merge_stats(acc, stats)
+    return totals
+
+def format_report(combos, totals, horizons):
+    lines = []
+    for params, stats in zip(combos, totals):
+        lines.append(" ".join(f"{k}={v}" for k, v in params.items()))
+        for typ in ("ULTRA BUY", "BUY", "SELL", "ULTRA SELL"):
+            st = stats.get(typ)
+            if not st:
+                continue
+            cells = []
+            for h_i, h in enumerate(horizons):
+                n = st["ret_n"][h_i]
+                if n:
+                    cells.append(f"+{h}: hit {st['hits'][h_i] / n:.1%} avg {st['ret_sum'][h_i] / n:+.3%}")
+            lines.append(f"  {typ:<10} n={st['n']:<5} " + " | ".join(cells))
+    return "\n".join(lines)
+
+def main():
+    ap = argparse.ArgumentParser(description="Backtest the combined RSI/MACD/EMA signals.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--archive", help="KlineArchive directory")
+    src.add_argument("--file", help="candles JSON {SYMBOL_interval: [[t,o,h,l,c,v],...]}")
+    ap.add_argument("--interval", default="15m")
+    ap.add_argument("--symbols", help="comma-separated (default: all available)")
+    ap.add_argument("--grid", help="e.g. 'rsi_buy=20,25;rsi_sell=75,80;signal_validity_min=20'")
+    ap.add_argument("--horizons", default="1,5,15,60", help="forward-return horizons in candles")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--rules", help="scoring rules JSON (see pipeline.py); default: built-in rules")
+    ap.add_argument("--out", help="write the raw results as JSON")
+    args = ap.parse_args()
+
+    combos = parse_grid(args.grid)
+    rules = Scorer.from_file(args.rules).rules if args.rules else None
+    horizons = [int(h) for h in args.horizons.split(",")]
+    wanted = set(args.symbols.split(",")) if args.symbols else None
+    jobs = []
+    if args.archive:
+        for symbol in sorted(os.listdir(args.archive)):
+            if (wanted is None or symbol in wanted) and os.path.isdir(os.path.join(args.archive, symbol, args.interval)):
+                jobs.append((("archive", args.archive), symbol, args.interval, combos, horizons, rules))
+    else:
+        with open(args.file) as f:
+            data = json.load(f)
+        for key, rows in sorted(data.items()):
+            symbol, _, interval = key.rpartition("_")
+            if interval == args.interval and (wanted is None or symbol in wanted):
+                jobs.append((("rows", rows), symbol, interval, combos, horizons, rules))
+    if not jobs:
+        raise SystemExit("no candles found for that interval/symbols")
+
+    started = time.time()
+    totals = run(jobs, combos, args.workers)
+    print(format_report(combos, totals, horizons))
+    print(f"\n{len(jobs)} series x {len(combos)} param sets in {time.time() - started:.1f}s")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump([{"params": p, "stats": t} for p, t in zip(combos, totals)], f, indent=1)
+
+if __name__ == "__main__":
+    main()
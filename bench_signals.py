@@ -0,0 +1,315 @@
+"""
+Benchmarks for the signal pipeline against recorded exchange/news responses.
+
+    python bench_signals.py                    # synthetic fixtures, sizes 10,50,100,300
+    python bench_signals.py --record 300       # record real Binance/CryptoPanic responses first
+    python bench_signals.py --sizes 10,50 --fail-on-regression
+
+A local HTTP stub serves the fixtures (klines are re-based so the newest candle is the
+current one), index.py is imported with its background threads off and its endpoints
+pointed at the stub, its weight limiter lifted, and Telegram sends replaced by a no-op.
+Reported: per-stage latency (get_klines cold/warm, compute_*, live_indicators,
+generate_combined_signal, send_signal_if_new, sentiment refresh), full-sweep time per
+universe size, and allocations per signal. Each run is appended to --history; a stage more than
+--tolerance slower than the previous run is flagged as a regression.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from kline_store import INTERVAL_MS
+
+INTERVALS = ["1m", "5m", "15m", "1h"]
+DEFAULT_FIXTURES = "bench_fixtures.json"
+DEFAULT_HISTORY = "bench_history.jsonl"
+
+# ----- fixtures -----
+def synthetic_fixtures(n_symbols, candles=500, seed=7):
+    rng = random.Random(seed)
+    now = int(time.time() * 1000)
+    klines, ticker = {}, []
+    for k in range(n_symbols):
+        sym = f"S{k:03d}USDT"
+        for intv in INTERVALS:
+            step = INTERVAL_MS[intv]
+            t = now // step * step - (candles - 1) * step
+            price = rng.uniform(0.1, 500)
+            rows = []
+            for _ in range(candles):
+                o = price
+                price *= 1 + rng.gauss(0, 0.004)
+                rows.append([t, f"{o:.6f}", f"{max(o, price):.6f}", f"{min(o, price):.6f}",
+                             f"{price:.6f}", f"{rng.uniform(10, 1e4):.2f}"])
+                t += step
+            klines[f"{sym}_{intv}"] = rows
+        ticker.append({"symbol": sym, "quoteVolume": str(rng.uniform(1e5, 1e9)),
+                       "priceChangePercent": f"{rng.uniform(-10, 10):.3f}"})
+    words = ["rally", "dump", "update", "breakout", "crash", "listing"]
+    posts = [{"title": f"{rng.choice(words)} news {i}",
+              "currencies": [{"code": f"S{rng.randrange(n_symbols):03d}"}]} for i in range(50)]
+    return {"klines": klines, "ticker24hr": ticker, "cryptopanic": {"results": posts}}
+
+def record_fixtures(n_symbols, candles=500):
+    import requests
+    base = "https://api.binance.com/api/v3"
+    ticker = requests.get(base + "/ticker/24hr", timeout=20).json()
+    usdt = sorted((t for t in ticker if t["symbol"].endswith("USDT")),
+                  key=lambda t: float(t.get("quoteVolume", 0) or 0), reverse=True)[:n_symbols]
+    klines = {}
+    for t in usdt:
+        for intv in INTERVALS:
+            klines[f"{t['symbol']}_{intv}"] = requests.get(
+                base + "/klines", params={"symbol": t["symbol"], "interval": intv, "limit": candles},
+                timeout=20).json()
+    posts = {"results": []}
+    key = os.environ.get("CRYPTOPANIC_KEY")
+    if key:
+        posts = requests.get("https://cryptopanic.com/api/v1/posts/",
+                             params={"auth_token": key, "public": "true", "kind": "news"}, timeout=20).json()
+    return {"klines": klines, "ticker24hr": usdt, "cryptopanic": posts}
+
+# ----- stub server -----
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out separately; avoid 40 ms ACK stalls
+    fixtures = {}
+    latency = 0.0
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-MBX-USED-WEIGHT-1M", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path.endswith("/klines"):
+            rows = self.fixtures["klines"].get(f"{q.get('symbol')}_{q.get('interval')}")
+            if not rows:
+                return self._send({"code": -1121, "msg": "Invalid symbol."}, 400)
+            step = INTERVAL_MS[q["interval"]]
+            shift = int(time.time() * 1000) // step * step - int(rows[-1][0])
+            limit = int(q.get("limit", 500))
+            return self._send([[int(r[0]) + shift] + list(r[1:]) for r in rows[-limit:]])
+        if url.path.endswith("/ticker/24hr"):
+            return self._send(self.fixtures["ticker24hr"])
+        if url.path.endswith("/exchangeInfo"):
+            return self._send({"symbols": [{"symbol": t["symbol"], "status": "TRADING", "quoteAsset": "USDT",
+                                            "baseAsset": t["symbol"][:-4]} for t in self.fixtures["ticker24hr"]]})
+        if url.path.endswith("/posts/"):
+            return self._send(self.fixtures["cryptopanic"])
+        self._send({"code": -1, "msg": "not stubbed"}, 404)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub(fixtures, latency=0.0):
+    StubHandler.fixtures = fixtures
+    StubHandler.latency = latency
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+# ----- harness -----
+def load_bot(stub_url, data_dir):
+    """
+    Import index.py offline: no background threads, endpoints on the stub, no Telegram,
+    and all of its files (state DB, JSON copies, kline archive) under `data_dir`.
+    """
+    os.environ["BITBOT_BACKGROUND"] = "0"
+    # before the import: opening and migrating the state DB happens at import time
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["KLINE_ARCHIVE_DIR"] = os.path.join(data_dir, "klines")
+    import index
+    from exchange_client import WeightLimiter
+    assert os.path.dirname(index.STATE_DB_FILE) == data_dir, "index ignored DATA_DIR"
+    index.KLINES_URL = stub_url + "/api/v3/klines"
+    index.TICKER_24HR = stub_url + "/api/v3/ticker/24hr"
+    index.market.ticker_url = index.TICKER_24HR
+    index.market.info_url = stub_url + "/api/v3/exchangeInfo"
+    index.CRYPTOPANIC_POSTS_URL = stub_url + "/api/v1/posts/"
+    index.CRYPTOPANIC_KEY = "bench"
+    index.bot.send_message = lambda *a, **k: None
+    # measure the pipeline, not Binance's weight budget (the stub doesn't enforce one)
+    index.exchange.limiter = WeightLimiter(limit_per_min=10**9)
+    return index
+
+def state_snapshot(path):
+    """All rows of a state DB, to check the benchmark left it alone."""
+    if not os.path.exists(path):
+        return None
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as c:
+        return c.execute("SELECT ns, key, value FROM kv ORDER BY ns, key").fetchall()
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return {"p50_ms": statistics.median(samples),
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "mean_ms": statistics.fmean(samples)}
+
+def fresh_caches(index):
+    index.kline_store.series.clear()
+    index.kline_store.archive = None
+    index.indicator_states.clear()
+    index.signal_cache.entries.clear()
+
+def bench_stages(index, symbol, repeat):
+    fresh_caches(index)
+    closes = index.get_klines(symbol, "15m", 200)
+    res = {}
+    res["get_klines_cold"] = timed(lambda: (index.kline_store.series.clear(),
+                                            index.get_klines(symbol, "15m", 200)), repeat)
+    res["get_klines_warm"] = timed(lambda: index.get_klines(symbol, "15m", 200), repeat)
+    res["compute_rsi"] = timed(lambda: index.compute_rsi(closes), repeat)
+    res["compute_ema"] = timed(lambda: index.compute_ema(closes), repeat)
+    res["compute_macd"] = timed(lambda: index.compute_macd(closes), repeat)
+    res["live_indicators"] = timed(lambda: index.live_indicators(symbol, "15m"), repeat)
+    res["generate_combined_signal"] = timed(lambda: index.generate_combined_signal(symbol, "15m"), repeat)
+    # oversold RSI, MACD above signal, price above EMA50: an alert under the default thresholds
+    sig = index.score_indicators(symbol, "15m", 10.0, 1.0, 0.5, 1.0, 2.0)
+    index.subscriptions.add_coin(index.CHAT_ID, symbol)
+
+    def send():
+        index.alerts.active.clear()
+        index.send_signal_if_new(symbol, "15m", sig)
+    res["send_signal_if_new"] = timed(send, repeat)
+    res["send_signal_if_new_cooldown"] = timed(lambda: index.send_signal_if_new(symbol, "15m", sig), repeat)
+    currencies = [symbol.replace("USDT", "")]
+    res["sentiment_refresh"] = timed(lambda: index.sentiment_cache.refresh(currencies), repeat)
+    return res
+
+def bench_allocations(index, symbol, n=20):
+    index.generate_combined_signal(symbol, "15m")
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(n):
+        index.generate_combined_signal(symbol, "15m")
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    return {"alloc_blocks_per_signal": sum(max(0, s.count_diff) for s in stats) / n,
+            "alloc_kib_per_signal": sum(max(0, s.size_diff) for s in stats) / n / 1024,
+            "peak_kib": peak / 1024}
+
+def bench_sweeps(index, symbols, sizes):
+    out = {}
+    for size in sizes:
+        universe = symbols[:size]
+        if len(universe) < size:
+            continue
+        pairs = [(s, i) for s in universe for i in INTERVALS]
+        fresh_caches(index)
+        t = time.perf_counter()
+        list(index.scan_pairs(pairs))
+        cold = time.perf_counter() - t
+        t = time.perf_counter()
+        list(index.scan_pairs(pairs))
+        warm = time.perf_counter() - t
+        out[str(size)] = {"pairs": len(pairs), "cold_s": cold, "warm_s": warm}
+    return out
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(prev, cur, tolerance):
+    """Stage names whose p50 (or sweep warm time) got more than `tolerance` slower."""
+    regressions = []
+    for name, st in cur["stages"].items():
+        old = prev.get("stages", {}).get(name)
+        if old and st["p50_ms"] > old["p50_ms"] * (1 + tolerance) and st["p50_ms"] - old["p50_ms"] > 0.05:
+            regressions.append(f"{name}: {old['p50_ms']:.3f} -> {st['p50_ms']:.3f} ms")
+    for size, st in cur["sweeps"].items():
+        old = prev.get("sweeps", {}).get(size)
+        if old and st["warm_s"] > old["warm_s"] * (1 + tolerance):
+            regressions.append(f"sweep {size}: {old['warm_s']:.3f} -> {st['warm_s']:.3f} s")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the signal pipeline offline.")
+    ap.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    ap.add_argument("--record", type=int, metavar="N", help="record N real symbols into --fixtures first")
+    ap.add_argument("--sizes", default="10,50,100,300")
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="artificial stub latency")
+    ap.add_argument("--history", default=DEFAULT_HISTORY)
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    if args.record:
+        fixtures = record_fixtures(args.record)
+        with open(args.fixtures, "w") as f:
+            json.dump(fixtures, f)
+    elif os.path.exists(args.fixtures):
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    else:
+        fixtures = synthetic_fixtures(max(sizes))
+    symbols = sorted({k.rpartition("_")[0] for k in fixtures["klines"]})
+
+    srv, url = start_stub(fixtures, args.latency_ms / 1000)
+    real_db = os.path.join(os.environ.get("DATA_DIR", "."), "state.db")
+    real_state = state_snapshot(real_db)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = load_bot(url, tmp)
+        result = {
+            "ts": time.time(), "rev": git_rev(), "python": sys.version.split()[0],
+            "fixtures": "recorded" if os.path.exists(args.fixtures) else "synthetic",
+            "stages": bench_stages(index, symbols[0], args.repeat),
+            "alloc": bench_allocations(index, symbols[0]),
+            "sweeps": bench_sweeps(index, symbols, sizes),
+        }
+        index.alerts.flush()
+        assert state_snapshot(real_db) == real_state, "benchmark wrote to the real state DB"
+    srv.shutdown()
+
+    for name, st in result["stages"].items():
+        print(f"{name:<30} p50 {st['p50_ms']:8.3f} ms   p95 {st['p95_ms']:8.3f} ms")
+    a = result["alloc"]
+    print(f"{'allocations/signal':<30} {a['alloc_blocks_per_signal']:.0f} blocks, {a['alloc_kib_per_signal']:.1f} KiB")
+    for size, st in result["sweeps"].items():
+        print(f"sweep {size:>4} symbols ({st['pairs']} pairs)  cold {st['cold_s']:.3f} s  warm {st['warm_s']:.3f} s")
+
+    prev = None
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            lines = [l for l in f if l.strip()]
+        prev = json.loads(lines[-1]) if lines else None
+    with open(args.history, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    regressions = compare(prev, result, args.tolerance) if prev else []
+    if regressions:
+        print("\nRegressions vs previous run:\n  " + "\n  ".join(regressions))
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
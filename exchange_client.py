@@ -0,0 +1,120 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+class WeightLimiter:
+    """
+    Token bucket over Binance request weight. Refills at limit/60 per second and is
+    re-synced from the X-MBX-USED-WEIGHT-1M header after every response.
+    """
+    def __init__(self, limit_per_min=6000, headroom=0.9):
+        self.capacity = limit_per_min * headroom
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight=1):
+        """Block until `weight` tokens are available, then take them. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return waited
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def sync(self, used_weight):
+        # the server's count is authoritative; never hold more tokens than it allows
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, self.capacity - used_weight)
+
+    def drain(self, seconds):
+        # after a 429/418 nothing should go out until the ban window has passed
+        with self.lock:
+            self.tokens = -seconds * self.rate
+            self.updated = time.monotonic()
+
+class ExchangeClient:
+    """
+    Shared HTTP client for Binance REST: keep-alive connection pool, weight-aware
+    token bucket, retry with backoff on 429/418/5xx, and latency/weight stats.
+    get_json() raises on network errors or when retries are exhausted.
+    """
+    def __init__(self, limit_per_min=6000, pool_size=32, max_retries=3, timeout=10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = WeightLimiter(limit_per_min)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "retries": 0, "throttled": 0,
+                      "latency_sum": 0.0, "latency_max": 0.0, "used_weight": 0, "wait_sum": 0.0}
+
+    def _record(self, latency, used_weight=None, error=False):
+        with self.lock:
+            st = self.stats
+            st["requests"] += 1
+            st["latency_sum"] += latency
+            st["latency_max"] = max(st["latency_max"], latency)
+            if used_weight is not None:
+                st["used_weight"] = used_weight
+            if error:
+                st["errors"] += 1
+
+    def get_json(self, url, params=None, weight=1):
+        backoff = 1.0
+        for attempt in range(self.max_retries + 1):
+            waited = self.limiter.acquire(weight)
+            if waited:
+                with self.lock:
+                    self.stats["wait_sum"] += waited
+            started = time.monotonic()
+            try:
+                r = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException:
+                self._record(time.monotonic() - started, error=True)
+                if attempt == self.max_retries:
+                    raise
+                with self.lock:
+                    self.stats["retries"] += 1
+                time.sleep(backoff)
+                backoff *= 2
+                continue
+            used = r.headers.get("X-MBX-USED-WEIGHT-1M") or r.headers.get("X-MBX-USED-WEIGHT")
+            used = int(used) if used and used.isdigit() else None
+            self._record(time.monotonic() - started, used, error=r.status_code >= 400)
+            if used is not None:
+                self.limiter.sync(used)
+            if r.status_code in (418, 429) or r.status_code >= 500:
+                retry_after = r.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff
+                throttled = r.status_code in (418, 429)
+                if throttled:
+                    with self.lock:
+                        self.stats["throttled"] += 1
+                    self.limiter.drain(delay)
+                if attempt == self.max_retries:
+                    r.raise_for_status()
+                with self.lock:
+                    self.stats["retries"] += 1
+                if not throttled:
+                    # after drain() the retry waits in acquire() like every other caller;
+                    # sleeping here as well would wait twice
+                    time.sleep(delay)
+                backoff *= 2
+                continue
+            return r.json()
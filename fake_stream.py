@@ -0,0 +1,138 @@
+"""
+Local stand-in for Binance combined kline streams, for testing push mode offline.
+
+    python fake_stream.py --port 9001 [--file candles.json] [--speed 60]
+    KLINE_STREAM=1 BINANCE_WS_URL=ws://127.0.0.1:9001 gunicorn index:app
+
+Streams requested in the URL (/stream?streams=btcusdt@kline_1m/...) are served from
+--file ({"BTCUSDT_1m": [[open_time, o, h, l, c, v], ...]}) when present, otherwise
+from a random walk. --speed compresses time: 60 means a 1m candle closes every second.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socketserver
+import struct
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from kline_store import INTERVAL_MS
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TICKS_PER_CANDLE = 4
+
+def encode_frame(text):
+    payload = text.encode("utf-8")
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x81, n)
+    elif n < 65536:
+        header = struct.pack("!BBH", 0x81, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x81, 127, n)
+    return header + payload
+
+def kline_message(symbol, interval, row, closed):
+    t, o, h, l, c, v = row
+    return json.dumps({
+        "stream": f"{symbol.lower()}@kline_{interval}",
+        "data": {"e": "kline", "E": int(time.time() * 1000), "s": symbol,
+                 "k": {"t": t, "T": t + INTERVAL_MS[interval] - 1, "s": symbol, "i": interval,
+                       "o": str(o), "h": str(h), "l": str(l), "c": str(c), "v": str(v), "x": closed}},
+    })
+
+def replay_rows(symbol, interval, recorded):
+    """Yield candle rows for one stream: the recorded ones, then a random walk."""
+    step = INTERVAL_MS[interval]
+    rows = recorded.get(f"{symbol}_{interval}") or []
+    for row in rows:
+        yield [int(row[0])] + [float(x) for x in row[1:6]]
+    price = float(rows[-1][4]) if rows else random.uniform(1, 100)
+    t = int(rows[-1][0]) + step if rows else int(time.time() * 1000) // step * step
+    while True:
+        o = price
+        price *= 1 + random.gauss(0, 0.002)
+        yield [t, o, max(o, price), min(o, price), price, random.uniform(1, 1000)]
+        t += step
+
+class StreamHandler(socketserver.BaseRequestHandler):
+    recorded = {}
+    speed = 60.0
+
+    def handshake(self):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return None
+            request += chunk
+        lines = request.decode("latin-1").split("\r\n")
+        path = lines[0].split(" ")[1]
+        headers = dict(l.split(": ", 1) for l in lines[1:] if ": " in l)
+        key = headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.request.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        streams = parse_qs(urlparse(path).query).get("streams", [""])[0]
+        return [s for s in streams.split("/") if "@kline_" in s]
+
+    def drain(self):
+        # discard client frames (pings, close); ends when the client disconnects
+        try:
+            while self.request.recv(4096):
+                pass
+        except OSError:
+            pass
+        self.closed = True
+
+    def handle(self):
+        streams = self.handshake()
+        if not streams:
+            return
+        self.closed = False
+        threading.Thread(target=self.drain, daemon=True).start()
+        feeds = []
+        for name in streams:
+            sym, intv = name.split("@kline_")
+            feeds.append((sym.upper(), intv, replay_rows(sym.upper(), intv, self.recorded)))
+        current = {i: next(gen) for i, (_, _, gen) in enumerate(feeds)}
+        tick = 0
+        try:
+            while not self.closed:
+                tick += 1
+                for i, (sym, intv, gen) in enumerate(feeds):
+                    candle_ticks = max(1, int(INTERVAL_MS[intv] / 60_000))  # 1m = one cycle
+                    row = current[i]
+                    closed = tick % (TICKS_PER_CANDLE * candle_ticks) == 0
+                    self.request.sendall(encode_frame(kline_message(sym, intv, row, closed)))
+                    if closed:
+                        current[i] = next(gen)
+                time.sleep(60.0 / self.speed / TICKS_PER_CANDLE)
+        except OSError:
+            pass
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9001)
+    ap.add_argument("--file", help="recorded candles JSON")
+    ap.add_argument("--speed", type=float, default=60.0)
+    args = ap.parse_args()
+    if args.file:
+        with open(args.file) as f:
+            StreamHandler.recorded = json.load(f)
+    StreamHandler.speed = args.speed
+    with Server((args.host, args.port), StreamHandler) as srv:
+        print(f"Fake kline stream on ws://{args.host}:{args.port}")
+        srv.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,29 @@
+import time
+# import time and time-to-first-response are measured from here, so the bot's own
+# modules (numpy via indicators/kline_store) count
+IMPORT_STARTED = time.perf_counter()
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from exchange_client import ExchangeClient
+from indicators import IndicatorState, rsi_wilder, score_batch, signal_type
+from alerts import AlertEngine
+from jobs import JobQueue
+from kline_archive import KlineArchive
+from kline_store import DERIVED_FROM, INTERVAL_MS, KlineStore
+from kline_stream import BINANCE_WS_URL, KlineStream
+from market import MarketData
+from metrics import Metrics, SamplingProfiler, ratio
+from movers import MoversEngine
+from outbox import Outbox
+from pipeline import Scorer
+from scan_scheduler import ScanScheduler
+from scanner_pool import LeaderLock
+from sentiment import SentimentCache, score_posts
+from signal_cache import SignalCache
+from state_store import StateStore
+from subscriptions import Subscriptions
+
 
 USER_COINS_FILE = os.path.join(DATA_DIR, "user_coins.json")
 SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
@@ -5,35 +31,84 @@ LAST_SIGNAL_FILE = os.path.join(DATA_DIR, "last_signals.json")
 MUTED_COINS_FILE = os.path.join(DATA_DIR, "muted_coins.json")
 COIN_INTERVALS_FILE = os.path.join(DATA_DIR, "coin_intervals.json")
 TOP_COINS_CACHE_FILE = os.path.join(DATA_DIR, "top_coins_cache.json")
+CHATS_FILE = os.path.join(DATA_DIR, "chats.json")
+STATE_DB_FILE = os.path.join(DATA_DIR, "state.db")
 
-def load_json(path, default):
-    try:
-        if not os.path.exists(path):
-            return default
-        with open(path, "r") as f:
-            return json.load(f)
-    except Exception:
-        return default
+# BITBOT_BACKGROUND=0 imports the bot without starting the warmup/scanner/refresh threads
+# (benchmarks, one-off scripts); they are started from the WARMUP section
+BACKGROUND_TASKS = os.environ.get("BITBOT_BACKGROUND", "1") != "0"
 
-def save_json(path, data):
-    try:
-        with open(path, "w") as f:
-            json.dump(data, f)
-    except Exception as e:
-        print("Save JSON error:", e)
+# hot-path latency/error instrumentation, served at /metrics
+metrics = Metrics()
 
-# persistent state
-coins = load_json(USER_COINS_FILE, [])                # list of symbols like BTCUSDT
-settings = load_json(SETTINGS_FILE, {
+# persistent state lives in SQLite (one row per key); the JSON files are the
+# import/export format: imported into empty namespaces, exported on startup (warmup)
+state = StateStore(STATE_DB_FILE)
+# (namespace, JSON file, stored as a list)
+STATE_FILES = [
+    ("coins", USER_COINS_FILE, True),
+    ("settings", SETTINGS_FILE, False),
+    ("last_signals", LAST_SIGNAL_FILE, False),
+    ("muted_coins", MUTED_COINS_FILE, True),
+    ("coin_intervals", COIN_INTERVALS_FILE, False),
+    ("top_coins_cache", TOP_COINS_CACHE_FILE, False),
+    ("chats", CHATS_FILE, False),
+]
+for _ns, _path, _as_list in STATE_FILES:
+    state.import_json(_ns, _path, _as_list)
+
+def export_state():
+    for ns, path, as_list in STATE_FILES:
+        try:
+            state.export_json(ns, path, as_list)
+        except Exception as e:
+            print("Export state error:", ns, e)
+
+settings_version = state.version("settings")
+settings = state.items("settings") or {
     "rsi_buy": 25,
     "rsi_sell": 75,
     "signal_validity_min": 20,
     "use_sentiment": True
-})
-last_signals = load_json(LAST_SIGNAL_FILE, {})        # key -> timestamp
-muted_coins = load_json(MUTED_COINS_FILE, [])        # list
-coin_intervals = load_json(COIN_INTERVALS_FILE, {})  # {symbol: [intervals]}
-top_coins_cache = load_json(TOP_COINS_CACHE_FILE, {"ts":0,"coins":[]})
+}
+# alert states "chat:SYMBOL_interval" -> {type, score, ts, until}, flushed in batches
+alerts = AlertEngine(state, hysteresis=int(os.environ.get("ALERT_HYSTERESIS", 1)),
+                     default_cooldown=settings.get("signal_validity_min", 20) * 60)
+top_coins_cache = state.items("top_coins_cache") or {"ts":0,"coins":[]}
+
+# ============= SUBSCRIPTIONS =============
+# per-chat watchlists/mutes/settings; `settings` above are the defaults
+CHAT_ID = 1263295916  # admin chat: inherits the coins/mutes from before per-chat subscriptions
+# chats that may opt into top-coins alerts with /start (OPEN_SIGNUP=1: any chat);
+# everyone else only gets alerts for coins they add
+ALLOWED_CHATS = {CHAT_ID} | {int(c) for c in os.environ.get("ALLOWED_CHATS", "").split(",") if c.strip()}
+OPEN_SIGNUP = os.environ.get("OPEN_SIGNUP", "").lower() in ("1", "true", "yes")
+subscriptions = Subscriptions(state, settings)
+subscriptions.seed(CHAT_ID, {"coins": list(state.items("coins")),
+                             "muted": list(state.items("muted_coins")),
+                             "intervals": state.items("coin_intervals")})
+subscriptions.enrol(CHAT_ID)
+
+# ============= OUTBOX =============
+def telegram_retry_after(e):
+    """
+    Seconds to wait before resending after a failed send, or None to give up.
+    """
+    if isinstance(e, telebot.apihelper.ApiTelegramException):
+        if e.error_code == 429:
+            # flood control: Telegram says how long to back off
+            return float(((e.result_json or {}).get("parameters") or {}).get("retry_after", 5))
+        return 1.0 if e.error_code >= 500 else None  # 400/403 (e.g. bot blocked) won't succeed later
+    return 2.0  # network error
+
+# alerts are queued here and delivered off the scanner thread within Telegram's rate limits;
+# the alerts of one sweep reach each chat as a single digest message
+outbox = Outbox(lambda chat_id, text: bot.send_message(chat_id=chat_id, text=text),
+                retry_after=telegram_retry_after,
+                # backstop only: the scanner flushes at the end of each candle-close wave
+                # (polling) or on every publish tick (KLINE_STREAM)
+                digest_window=float(os.environ.get("DIGEST_WINDOW", 30)),
+                on_sent=lambda seconds: metrics.observe("bitbot_delivery_seconds", seconds))
 
 # ============= UTILITIES =============
 def normalize_symbol(user_input: str) -> str:
@@ -49,46 +124,80 @@ def normalize_symbol(user_input: str) -> str:
         return None
     if not s.endswith("USDT"):
         s = s + "USDT"
+    # reject pairs that don't trade (typos, delisted) before they cost kline calls
+    if not market.valid(s):
+        return None
     return s
 
-def get_klines(symbol: str, interval: str = "15m", limit: int = 200):
+# one pooled, weight-limited session for all Binance REST calls
+exchange = ExchangeClient(limit_per_min=int(os.environ.get("BINANCE_WEIGHT_LIMIT", 6000)))
+KLINES_WEIGHT = 2
+
+# tradable-symbol index (exchangeInfo) and 24h volume/change rankings kept current
+# from the all-market ticker stream (REST polling without websocket-client)
+market = MarketData(exchange.get_json, ws_url=os.environ.get("MARKET_WS_URL", BINANCE_WS_URL),
+                    ticker_url=TICKER_24HR)
+
+def fetch_klines_raw(symbol: str, interval: str, limit: int):
     """
-    Return list of close prices (floats) or None on error.
+    Return raw Binance kline rows or None on error.
     """
+    started = time.perf_counter()
     try:
         params = {"symbol": symbol, "interval": interval, "limit": limit}
-        r = requests.get(KLINES_URL, params=params, timeout=10)
-        data = r.json()
+        data = exchange.get_json(KLINES_URL, params=params, weight=KLINES_WEIGHT)
         # Binance returns dict with error when invalid
         if isinstance(data, dict) and data.get("code"):
             # print debug for developer
             # print("[BINANCE ERROR]", symbol, interval, data)
+            metrics.inc("bitbot_kline_fetch_errors_total", symbol=symbol, kind="api")
             return None
-        closes = [float(k[4]) for k in data]
-        return closes
+        return data
     except Exception as e:
         # print("Klines error:", e)
+        metrics.inc("bitbot_kline_fetch_errors_total", symbol=symbol, kind=type(e).__name__)
         return None
+    finally:
+        metrics.observe("bitbot_kline_fetch_seconds", time.perf_counter() - started, interval=interval)
 
+# candles are kept in memory per (symbol, interval) and topped up with small delta fetches
+# closed candles are also archived on disk so restarts don't refetch full histories
+# higher intervals are topped up from the 1m series in memory (KLINE_RESAMPLE=0 fetches each one)
+KLINE_RESAMPLE = os.environ.get("KLINE_RESAMPLE", "1") != "0"
+kline_archive = KlineArchive(os.environ.get("KLINE_ARCHIVE_DIR", os.path.join(DATA_DIR, "klines")))
+kline_store = KlineStore(fetch_klines_raw, capacity=300, max_series=1500, archive=kline_archive,
+                         derive=DERIVED_FROM if KLINE_RESAMPLE else None)
+
+@metrics.timed("bitbot_get_klines_seconds")
+def get_klines(symbol: str, interval: str = "15m", limit: int = 200):
+    """
+    Return list of close prices (floats) or None on error.
+    """
+    try:
+        closes = kline_store.get(symbol, interval, "close", limit)
+        if closes is None:
+            return None
+        return closes.tolist()
+    except Exception as e:
+        # print("Klines error:", e)
+        return None
+
+@metrics.timed("bitbot_indicator_seconds", fn="rsi")
 def compute_rsi(closes, period=14):
     if len(closes) < period+1:
         return None
-    arr = np.array(closes)
-    delta = np.diff(arr)
-    up = np.where(delta>0, delta, 0)
-    down = np.where(delta<0, -delta, 0)
-    # Wilder's smoothing
-    roll_up = pd.Series(up).rolling(period).mean()
-    roll_down = pd.Series(down).rolling(period).mean()
-    rs = roll_up / (roll_down.replace(0, np.nan))
-    rsi = 100 - (100 / (1 + rs))
-    return float(rsi.iloc[-1])
+    # Wilder's smoothing (same averages as IndicatorState)
+    return rsi_wilder(closes, period)
 
+@metrics.timed("bitbot_indicator_seconds", fn="ema")
 def compute_ema(closes, period=50):
+    import pandas as pd  # loaded on first use, not on the web worker's startup path
     s = pd.Series(closes)
     return float(s.ewm(span=period, adjust=False).mean().iloc[-1])
 
+@metrics.timed("bitbot_indicator_seconds", fn="macd")
 def compute_macd(closes):
+    import pandas as pd
     s = pd.Series(closes)
     ema12 = s.ewm(span=12, adjust=False).mean()
     ema26 = s.ewm(span=26, adjust=False).mean()
@@ -97,73 +206,136 @@ def compute_macd(closes):
     return float(macd_line.iloc[-1]), float(signal.iloc[-1])
 
 # CryptoPanic sentiment
+CRYPTOPANIC_POSTS_URL = "https://cryptopanic.com/api/v1/posts/"
+
 def fetch_sentiment_for(symbol_short: str, limit=10):
     """
     Fetch recent CryptoPanic posts for the given coin short symbol (e.g., BTC)
     Returns sentiment score: -1..+1 (average), and count
     """
+    return (fetch_sentiment_batch([symbol_short], limit) or {}).get(symbol_short, (0.0, 0))
+
+@metrics.timed("bitbot_sentiment_fetch_seconds")
+def fetch_sentiment_batch(symbol_shorts, limit=10):
+    """
+    One CryptoPanic request for several coins (comma-separated `currencies`).
+    Returns {short: (score, count)}; posts are attributed by their `currencies` codes.
+    None if the request failed (errors, rate limits), so cached scores are kept.
+    """
     try:
-        if not CRYPTOPANIC_KEY:
-            return 0.0, 0
-        url = "https://cryptopanic.com/api/v1/posts/"
-        params = {"auth_token": CRYPTOPANIC_KEY, "currencies": symbol_short, "public": "true", "kind": "news"}
-        r = requests.get(url, params=params, timeout=8)
-        js = r.json()
-        posts = js.get("results") or js.get("results", [])
-        if not posts:
-            return 0.0, 0
-        score = 0
-        count = 0
-        for p in posts[:limit]:
-            # CryptoPanic has 'votes' with 'positive' and 'negative'? fallback use sentiment field 'title' scan
-            # Simpler approach: look for "positive"/"bull"/"up"/"buy" in title or 'sentiment' key
-            title = (p.get("title") or "").lower()
-            # heuristics
-            if any(w in title for w in ["bull", "positive", "up", "surge", "rally", "breakout", "buy"]):
-                score += 1
-            elif any(w in title for w in ["bear", "negative", "down", "dump", "sell", "crash", "drop"]):
-                score -= 1
-            else:
-                # neutral
-                score += 0
-            count += 1
-        if count == 0:
-            return 0.0, 0
-        return score / count, count
+        if not CRYPTOPANIC_KEY or not symbol_shorts:
+            return {}
+        params = {"auth_token": CRYPTOPANIC_KEY, "currencies": ",".join(symbol_shorts), "public": "true", "kind": "news"}
+        r = requests.get(CRYPTOPANIC_POSTS_URL, params=params, timeout=8)
+        r.raise_for_status()
+        posts = r.json().get("results") or []
+        by_code = {c: [] for c in symbol_shorts}
+        for p in posts:
+            codes = [c.get("code") for c in (p.get("currencies") or [])]
+            if len(symbol_shorts) == 1 and not codes:
+                codes = symbol_shorts
+            for code in codes:
+                if code in by_code:
+                    by_code[code].append(p)
+        return {c: score_posts(ps, limit) for c, ps in by_code.items()}
     except Exception as e:
         # print("Sentiment fetch error:", e)
-        return 0.0, 0
+        metrics.inc("bitbot_sentiment_fetch_seconds_errors_total")
+        return None
+
+# scores are cached per currency and refreshed in the background, off the signal path
+sentiment_cache = SentimentCache(lambda shorts: fetch_sentiment_batch(shorts, limit=6),
+                                 ttl=int(os.environ.get("SENTIMENT_TTL", 600)))
 
 def get_top_coins(n=50, force_refresh=False):
     """
     Return list of top n USDT trading symbols by quoteVolume.
-    Cache for 10 minutes in file to avoid rate limits.
+    Read off the market volume ranking while it is being kept fresh; otherwise
+    cached for 10 minutes in state to avoid rate limits.
     """
     global top_coins_cache
+    if market.fresh() and not force_refresh:
+        return market.top_volume(n)
     now = time.time()
     cached = top_coins_cache
     if not force_refresh and cached.get("ts", 0) + 600 > now and cached.get("coins"):
         return cached["coins"][:n]
     try:
-        r = requests.get(TICKER_24HR, timeout=10).json()
-        # filter USDT pairs
-        usdt = [x for x in r if x.get("symbol", "").endswith("USDT")]
-        # sort by quoteVolume
-        sorted_ = sorted(usdt, key=lambda x: float(x.get("quoteVolume", 0) or 0), reverse=True)
-        top = [x["symbol"] for x in sorted_[:n]]
+        market.refresh_tickers()
+        top = market.top_volume(n)
+        if not top:
+            raise ValueError("empty ticker snapshot")
         top_coins_cache = {"ts": now, "coins": top}
-        save_json(TOP_COINS_CACHE_FILE, top_coins_cache)
+        state.put_many("top_coins_cache", top_coins_cache)
         return top
     except Exception:
         return cached.get("coins", ["BTCUSDT","ETHUSDT","BNBUSDT"])
 
+# ----- Top Movers rankings -----
+TICKER_WINDOW_URL = "https://api.binance.com/api/v3/ticker"  # rolling-window price change
+# windows that can be answered from buffered candles: [(interval, candles)], first hit wins
+MOVERS_FROM_CANDLES = {"5m": [("1m", 5)], "1h": [("1m", 60), ("5m", 12), ("15m", 4)]}
+
+def fetch_movers_pct(symbols, window):
+    """
+    {symbol: percent change} for a window. symbols=None means all USDT pairs (24h, from
+    the market rankings); otherwise one rolling-window ticker request per 50 symbols.
+    """
+    if symbols is None:
+        if not market.fresh():
+            market.refresh_tickers()
+        return market.change_pct()
+    out = {}
+    for i in range(0, len(symbols), 50):
+        chunk = symbols[i:i + 50]
+        params = {"symbols": json.dumps(chunk, separators=(",", ":")), "windowSize": window}
+        # weight is 4 per symbol, capped at 200 per request
+        data = exchange.get_json(TICKER_WINDOW_URL, params=params, weight=min(200, 4 * len(chunk)))
+        if isinstance(data, dict):
+            continue  # Binance error (e.g. an invalid symbol in the chunk)
+        for d in data:
+            out[d["symbol"]] = float(d.get("priceChangePercent", 0) or 0)
+    return out
+
+def movers_pct_from_store(symbol, window):
+    for interval, n in MOVERS_FROM_CANDLES.get(window, []):
+        snap = kline_store.snapshot(symbol, interval, n, ("open_time", "open", "close"), fetch=False)
+        if snap is None or len(snap["close"]) < n:
+            continue
+        if time.time() * 1000 - snap["open_time"][-1] > 2 * INTERVAL_MS[interval]:
+            continue  # buffer not being kept up to date
+        base = snap["open"][0]
+        if base:
+            return float((snap["close"][-1] - base) / base * 100)
+    return None
+
+movers = MoversEngine(lambda window: None if window == "24h" else get_top_coins(50),
+                      fetch_movers_pct, movers_pct_from_store, refresh=60)
+
 # ============= SIGNAL LOGIC =============
+# scoring rules (pipeline.py); SCORING_RULES=path/to/rules.json replaces the built-in RSI/MACD/EMA rules
+def load_scorer(path):
+    if path:
+        try:
+            return Scorer.from_file(path)
+        except Exception as e:
+            print("Scoring rules error:", e)
+    return Scorer()
+
+scorer = load_scorer(os.environ.get("SCORING_RULES"))
+
 def generate_combined_signal(symbol: str, interval: str):
     """
     Returns a dict: {"type": "ULTRA BUY"|"ULTRA SELL"|"BUY"|"SELL"|"HOLD", "text": "...", "score": float}
     Combines RSI + MACD + EMA with optional sentiment.
     """
     closes = get_klines(symbol, interval, limit=200)
+    return score_closes(symbol, interval, closes)
+
+def score_closes(symbol: str, interval: str, closes):
+    """
+    Scoring half of generate_combined_signal, for callers that already hold the closes.
+    """
     if not closes or len(closes) < 30:
         return None
     try:
@@ -174,112 +346,398 @@ def generate_combined_signal(symbol: str, interval: str):
     except Exception as e:
         # print("Indicator error:", e)
         return None
+    extra = scorer.extra_values({"close": closes}) if scorer.extra_keys else None
+    return score_indicators(symbol, interval, rsi_val, macd_val, macd_signal, ema50, last_price, extra=extra)
 
-    # indicator scoring
-    score = 0
-    # RSI extremes:
-    if rsi_val is not None:
-        if rsi_val < settings.get("rsi_buy", 25):
-            score += 2
-        elif rsi_val < settings.get("rsi_buy", 25) + 10:
-            score += 1
-        if rsi_val > settings.get("rsi_sell", 75):
-            score -= 2
-        elif rsi_val > settings.get("rsi_sell", 75) - 10:
-            score -= 1
-
-    # MACD momentum
-    if macd_val is not None and macd_signal is not None:
-        if macd_val > macd_signal:
-            score += 1
-        else:
-            score -= 1
+# incremental indicator state per (symbol, interval), fed from kline_store
+indicator_states = {}
+indicator_states_lock = threading.Lock()
 
-    # Price vs EMA
-    if last_price > ema50:
-        score += 1
-    else:
-        score -= 1
+@metrics.timed("bitbot_indicator_seconds", fn="live")
+def live_indicators(symbol: str, interval: str, fetch=True):
+    """
+    Return {"price","rsi","ema50","macd","macd_signal","open_time"} for the current candle, or None
+    (plus "extra" when the scoring rules use other indicators).
+    Only candles closed since the previous call are folded in (O(1) each).
+    fetch=False uses whatever is buffered (push mode keeps the buffers current).
+    """
+    fields = ("open_time", "open", "high", "low", "close", "volume") if scorer.extra_keys else ("open_time", "close")
+    snap = kline_store.snapshot(symbol, interval, 200, fields, fetch=fetch)
+    if snap is None or len(snap["close"]) < 30:
+        return None
+    with indicator_states_lock:
+        state = indicator_states.get((symbol, interval))
+        if state is None:
+            state = indicator_states[(symbol, interval)] = IndicatorState()
+    vals = state.sync(snap["open_time"], snap["close"])
+    if vals:
+        vals["open_time"] = int(snap["open_time"][-1])
+        if scorer.extra_keys:
+            vals["extra"] = pipeline_values(symbol, interval, snap)
+    return vals
+
+# last candle row -> extra indicator values, per (symbol, interval)
+pipeline_cache = {}
+
+def pipeline_values(symbol: str, interval: str, snap):
+    """
+    Values of the indicators the scoring rules add beyond IndicatorState, for the
+    snapshot's last candle. The pipeline graph runs once per candle update; repeated
+    evaluations of an unchanged candle reuse it.
+    """
+    row = (int(snap["open_time"][-1]), float(snap["close"][-1]), float(snap["volume"][-1]))
+    hit = pipeline_cache.get((symbol, interval))
+    if hit and hit[0] == row:
+        return hit[1]
+    extra = scorer.extra_values(snap)
+    pipeline_cache[(symbol, interval)] = (row, extra)
+    return extra
+
+def live_signal(symbol: str, interval: str, fetch=True):
+    """
+    Score the current candle from the incremental state: (open_time, signal) or (None, None).
+    """
+    return signal_from_vals(symbol, interval, live_indicators(symbol, interval, fetch))
+
+def signal_from_vals(symbol: str, interval: str, vals):
+    """
+    (open_time, signal) for live_indicators()-style values, or (None, None).
+    """
+    if not vals:
+        return None, None
+    sig = score_indicators(symbol, interval, vals["rsi"], vals["macd"], vals["macd_signal"],
+                           vals["ema50"], vals["price"], extra=vals.get("extra"))
+    return vals["open_time"], sig
+
+# latest signal per pair, written by the scanner and read by the UI handlers
+signal_cache = SignalCache(max_age=int(os.environ.get("SIGNAL_MAX_AGE", 60)))
+
+def current_signal(symbol: str, interval: str):
+    """
+    Scanner's snapshot for the pair if it is fresh, else computed once (concurrent
+    callers for the same pair share that computation).
+    """
+    return signal_cache.get_or_compute(symbol, interval,
+                                       lambda: shared_signal(symbol, interval) or live_signal(symbol, interval))
 
-    # Sentiment optionally
+def shared_signal(symbol: str, interval: str):
+    """
+    Fresh (open_time, signal) published by the scanner running in another process, or None.
+    """
+    if scanner_lock.held():
+        return None
+    rec = state.get("signals", f"{symbol}_{interval}")
+    if rec and time.time() - rec["ts"] <= signal_cache.max_age:
+        return rec["open_time"], rec["signal"]
+    return None
+
+def publish_signals(items):
+    """
+    Share scanner results [(symbol, interval, open_time, signal)] with the other
+    processes (web workers read them through shared_signal).
+    """
+    now_ts = time.time()
+    try:
+        state.put_many("signals", {f"{sym}_{intv}": {"open_time": ot, "signal": sig, "ts": now_ts}
+                                   for sym, intv, ot, sig in items})
+    except Exception as e:
+        print("Publish signals error:", e)
+
+ALERT_TYPES = ("ULTRA BUY","ULTRA SELL","BUY","SELL")
+
+def score_indicators(symbol, interval, rsi_val, macd_val, macd_signal, ema50, last_price, prefs=None, extra=None):
+    """
+    Turn indicator values into the signal dict returned by generate_combined_signal.
+    The dict keeps the raw values so rescore() can apply other thresholds to it;
+    `extra` holds the values of any other indicators the scoring rules use.
+    """
+    prefs = prefs or settings
+    # Sentiment optionally (looked up if any chat uses it, so the snapshot can be shared)
     sentiment_score = 0.0
     sentiment_count = 0
-    if settings.get("use_sentiment", True):
+    if prefs.get("use_sentiment", True) or subscriptions.uses_sentiment():
         # derive ticker short e.g., BTC from BTCUSDT
         short = symbol.replace("USDT","")
-        sentiment_score, sentiment_count = fetch_sentiment_for(short, limit=6)
-        # sentiment_score in -1..1 -> affect score
-        score += int(np.sign(sentiment_score))  # +1, 0, or -1
+        sentiment_score, sentiment_count = sentiment_cache.get(short)
 
+    rsi_txt = f"{rsi_val:.2f}" if rsi_val is not None else "n/a"
+    text = (f"{symbol} {interval} | Price {last_price:.6f} | RSI {rsi_txt} | MACD {macd_val:.6f}/{macd_signal:.6f} | EMA50 {ema50:.6f} | Sent({sentiment_count}) {sentiment_score:.2f}")
+    sig = {"text": text, "sentiment": sentiment_score, "sent_count": sentiment_count, "price": last_price,
+           "rsi": rsi_val, "macd": macd_val, "macd_signal": macd_signal, "ema50": ema50}
+    if extra:
+        sig["extra"] = extra
+    return rescore(sig, prefs)
+
+def rescore(sig, prefs):
+    """
+    Copy of a signal with type/score for a chat's thresholds (no indicator recompute).
+    """
+    # indicator scoring: the configured rules (default: RSI extremes, MACD momentum, price vs EMA)
+    score = scorer.score(scorer.values(sig, sig.get("extra")), {"rsi_buy": 25, "rsi_sell": 75, **prefs})
+    if prefs.get("use_sentiment", True):
+        # sentiment_score in -1..1 -> affect score
+        score += int(np.sign(sig["sentiment"]))  # +1, 0, or -1
     # Map total score to signal type
     # score can be roughly between -6 and +6
-    text = (f"{symbol} {interval} | Price {last_price:.6f} | RSI {rsi_val:.2f} | MACD {macd_val:.6f}/{macd_signal:.6f} | EMA50 {ema50:.6f} | Sent({sentiment_count}) {sentiment_score:.2f}")
-    signal_type = None
-    if score >= 4:
-        signal_type = "ULTRA BUY"
-    elif score >= 2:
-        signal_type = "BUY"
-    elif score <= -4:
-        signal_type = "ULTRA SELL"
-    elif score <= -2:
-        signal_type = "SELL"
-    else:
-        signal_type = "HOLD"
-    return {"type": signal_type, "text": text, "score": score, "sentiment": sentiment_score, "sent_count": sentiment_count}
+    return dict(sig, type=signal_type(score), score=score)
 
+def batch_signals(symbols, interval, limit=200, prefs=None):
+    """
+    Score many symbols on one interval with a single vectorized pass (score_batch).
+    Returns [(symbol, signal)] for BUY/SELL-type signals only, in symbol order.
+    Sentiment is only looked up for symbols it could still push over the threshold.
+    Pairs with a fresh scanner snapshot in signal_cache are not recomputed, only
+    rescored for `prefs` (a chat's settings; default: global settings).
+    """
+    prefs = prefs or settings
+    cached = {sym: signal_cache.get(sym, interval) for sym in symbols}
+    cached = {sym: sig and rescore(sig, prefs) for sym, sig in cached.items()}
+    todo = [sym for sym in symbols if cached[sym] is None]
+    computed = {}
+    if not scorer.is_default:
+        # score_batch only knows the built-in rules: configured ones go through the pipeline
+        with ThreadPoolExecutor(max_workers=max(1, SCAN_MAX_WORKERS)) as pool:
+            sigs = pool.map(lambda sym: signal_from_vals(sym, interval, live_indicators(sym, interval))[1], todo)
+            computed = {sym: sig and rescore(sig, prefs) for sym, sig in zip(todo, sigs)}
+        todo = []
+    with ThreadPoolExecutor(max_workers=max(1, SCAN_MAX_WORKERS)) as pool:
+        closes = list(pool.map(lambda sym: kline_store.get(sym, interval, "close", limit), todo))
+    fetched = [(sym, c) for sym, c in zip(todo, closes) if c is not None and len(c) >= 30]
+    # the matrix needs equal-length rows; short histories (new listings) go the scalar way
+    width = max((len(c) for _, c in fetched), default=0)
+    full = [(sym, c) for sym, c in fetched if len(c) == width]
+    results = {}
+    if full:
+        results = dict(zip([sym for sym, _ in full],
+                           score_batch(np.vstack([c for _, c in full]),
+                                       prefs.get("rsi_buy", 25), prefs.get("rsi_sell", 75))))
+    need = 1 if prefs.get("use_sentiment", True) else 2
+    for sym, c in fetched:
+        r = results.get(sym)
+        if r is None:
+            sig = score_closes(sym, interval, c.tolist())
+            sig = sig and rescore(sig, prefs)
+        elif abs(int(r["score"])) < need:
+            continue
+        else:
+            rsi_val = None if np.isnan(r["rsi"]) else float(r["rsi"])
+            sig = score_indicators(sym, interval, rsi_val, float(r["macd"]), float(r["macd_signal"]),
+                                   float(r["ema50"]), float(r["price"]), prefs)
+        computed[sym] = sig
+    out = []
+    for sym in symbols:
+        sig = cached[sym] or computed.get(sym)
+        if sig and sig["type"] in ALERT_TYPES:
+            out.append((sym, sig))
+    return out
+
+@metrics.timed("bitbot_send_signal_seconds")
 def send_signal_if_new(symbol, interval, signal):
     """
-    Use last_signals persistence to avoid repeats.
+    Fan a pair's signal out to the chats subscribed to it. Each chat's thresholds are
+    applied to the shared signal; the alert engine suppresses repeats per chat within
+    its cooldown (flips and escalations still go out). Returns the number of chats alerted.
     """
-    try:
-        key = f"{symbol}_{interval}"
-        now_ts = time.time()
-        cooldown = settings.get("signal_validity_min", 20) * 60
-        if symbol in muted_coins:
-            return False
-        last = last_signals.get(key, 0)
-        if now_ts - last > cooldown:
-            # send
-            msg = f"⚡ {signal['type']} {symbol}\n{signal['text']}\nScore: {signal['score']}"
-            bot.send_message(chat_id=CHAT_ID, text=msg)
-            last_signals[key] = now_ts
-            save_json(LAST_SIGNAL_FILE, last_signals)
-            return True
-        return False
-    except Exception as e:
-        print("send_signal_if_new error:", e)
-        return False
+    sent = 0
+    now_ts = time.time()
+    for chat_id in subscriptions.chats_for(symbol, interval):
+        try:
+            prefs = subscriptions.prefs(chat_id)
+            sig = rescore(signal, prefs)
+            if sig["type"] not in ALERT_TYPES:
+                continue
+            cooldown = prefs.get("signal_validity_min", 20) * 60
+            if alerts.decide(chat_id, symbol, interval, sig["type"], sig["score"], cooldown, now_ts):
+                msg = f"⚡ {sig['type']} {symbol}\n{sig['text']}\nScore: {sig['score']}"
+                outbox.send(chat_id, msg, digest=True)
+                metrics.inc("bitbot_signals_total", result="sent")
+                sent += 1
+            else:
+                metrics.inc("bitbot_signals_total", result="cooldown")
+        except Exception as e:
+            print("send_signal_if_new error:", chat_id, e)
+            metrics.inc("bitbot_signals_total", result="error")
+    return sent
 
 # ============= BACKGROUND SCANNER =============
 auto_signals_enabled = True
-tracked_single = None  # if user sets a particular coin to track right now
 
-def background_signal_scanner():
+SCAN_MAX_WORKERS = int(os.environ.get("SCAN_MAX_WORKERS", 16))  # max in-flight kline fetches
+last_sweep_stats = {"ts": 0, "pairs": 0, "signals": 0, "duration": 0.0}
+
+def scan_pairs(pairs, max_workers=SCAN_MAX_WORKERS):
+    """
+    Fan out kline fetches + incremental indicator updates over (symbol, interval)
+    pairs on a bounded thread pool. Yields (symbol, interval, open_time, signal) as each completes.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(live_signal, sym, intv): (sym, intv) for sym, intv in pairs}
+        for fut in as_completed(futures):
+            sym, intv = futures[fut]
+            try:
+                open_time, sig = fut.result()
+                if sig:
+                    signal_cache.put(sym, intv, open_time, sig)
+            except Exception as e:
+                print("Scan error:", sym, intv, e)
+                open_time, sig = None, None
+            yield sym, intv, open_time, sig
+
+def scan_sharded(shards, pairs):
+    """
+    scan_pairs() over a ShardedScanner: the worker processes fetch candles and update
+    indicators, scoring (settings, sentiment) happens here.
+    """
+    for sym, intv, vals in shards.scan(pairs):
+        try:
+            open_time, sig = signal_from_vals(sym, intv, vals)
+        except Exception as e:
+            print("Scan error:", sym, intv, e)
+            open_time, sig = None, None
+        if sig:
+            signal_cache.put(sym, intv, open_time, sig)
+        yield sym, intv, open_time, sig
+
+def on_stream_candle(symbol, interval, closed):
+    """
+    Push mode: evaluate a pair as soon as its candle updates on the kline stream.
+    """
+    if not auto_signals_enabled:
+        return
+    open_time, sig = live_signal(symbol, interval, fetch=False)
+    if not sig:
+        return
+    signal_cache.put(symbol, interval, open_time, sig)
+    with stream_pending_lock:
+        stream_pending[(symbol, interval)] = (open_time, sig)
+    send_signal_if_new(symbol, interval, sig)
+
+# push mode publishes the latest signal per pair once per tick, not one write per message
+STREAM_PUBLISH_EVERY = 2.0
+stream_pending = {}
+stream_pending_lock = threading.Lock()
+
+def publish_stream_signals():
+    with stream_pending_lock:
+        items = [(sym, intv, ot, sig) for (sym, intv), (ot, sig) in stream_pending.items()]
+        stream_pending.clear()
+    if items:
+        publish_signals(items)
+
+# optional push mode: KLINE_STREAM=1 (BINANCE_WS_URL=ws://127.0.0.1:9001 for fake_stream.py)
+kline_stream = None
+
+def start_kline_stream():
+    global kline_stream
+    if os.environ.get("KLINE_STREAM", "").lower() in ("1", "true", "yes"):
+        stream = KlineStream(kline_store, on_stream_candle, os.environ.get("BINANCE_WS_URL", BINANCE_WS_URL))
+        if stream.start():
+            kline_stream = stream
+
+def active_pairs():
+    # every pair any chat follows, once; chats without coins follow the top 50
+    pairs = subscriptions.pairs(get_top_coins(50) if subscriptions.follows_top() else [])
+    # watchlist entries from before symbol validation may not trade
+    return [(sym, intv) for sym, intv in pairs if market.valid(sym)]
+
+# pairs are evaluated when their candle closes (or the price moves), not on a fixed cadence
+scan_scheduler = ScanScheduler(move_pct=float(os.environ.get("SCAN_MOVE_PCT", 1.0)) / 100)
+PAIRS_REFRESH = 30  # seconds between re-reads of the active pair list
+
+# exactly one scanner per deployment: whoever holds the lock scans, the others
+# (other gunicorn workers) only serve the UI and read published signals.
+# SCANNER_MODE=service leaves scanning to scanner_service.py (process-sharded).
+SCANNER_MODE = os.environ.get("SCANNER_MODE", "thread")
+scanner_lock = LeaderLock(os.path.join(DATA_DIR, "scanner.lock"))
+
+def run_scanner(scan=scan_pairs, leader=False):
+    """
+    Wait for scanner leadership (unless the caller already took it: `leader`),
+    then run the scanner loop on this thread.
+    """
+    while not leader and not scanner_lock.acquire():
+        time.sleep(PAIRS_REFRESH)
+    print("Scanner leader:", os.getpid())
+    start_kline_stream()
+    background_signal_scanner(scan)
+
+def sync_shared_state():
+    """
+    Pick up what other processes (web workers) changed: subscriptions, global
+    settings and alert resets. One version read each when nothing changed.
+    Returns True if the subscriptions changed (the pair set may have).
+    """
+    global settings_version
+    changed = subscriptions.sync()
+    alerts.sync()
+    version = state.version("settings")
+    if version != settings_version:
+        settings.update(state.items("settings"))
+        settings_version = version
+    return changed
+
+def background_signal_scanner(scan=scan_pairs):
+    global last_sweep_stats
+    pairs_synced = 0
+    cycle = {"ts": 0, "pairs": 0, "signals": 0, "duration": 0.0}  # totals for the current close wave
     while True:
         try:
             if not auto_signals_enabled:
                 time.sleep(5)
                 continue
-            # active coins: user coins if present else top 50
-            active = list(coins) if coins else get_top_coins(50)
-            if tracked_single:
-                if tracked_single not in active:
-                    active.append(tracked_single)
-            # iterate coins
-            for symbol in active:
-                intervals = coin_intervals.get(symbol, ["1m","5m","15m","1h"])
-                for interval in intervals:
-                    sig = generate_combined_signal(symbol, interval)
-                    if sig and sig["type"] in ("ULTRA BUY","ULTRA SELL","BUY","SELL"):
-                        send_signal_if_new(symbol, interval, sig)
-            # sleep - you can reduce or increase interval as desired
-            time.sleep(30)
+            if sync_shared_state():
+                pairs_synced = 0
+            if kline_stream:
+                # signals are evaluated on stream updates; keep subscriptions in sync,
+                # publish what the stream produced and deliver its alerts now rather
+                # than after the digest window (which only backs up the polling waves)
+                if time.time() - pairs_synced >= PAIRS_REFRESH:
+                    kline_stream.set_pairs(active_pairs())
+                    alerts.flush()
+                    pairs_synced = time.time()
+                publish_stream_signals()
+                outbox.flush()
+                time.sleep(STREAM_PUBLISH_EVERY)
+                continue
+            if time.time() - pairs_synced >= PAIRS_REFRESH:
+                scan_scheduler.set_pairs(active_pairs())
+                pairs_synced = time.time()
+            due = scan_scheduler.pop_due()
+            if not due:
+                time.sleep(scan_scheduler.wait())
+                continue
+            started = time.time()
+            if not cycle["ts"]:
+                cycle["ts"] = started
+            sent = 0
+            for _, _, late in due:
+                metrics.observe("bitbot_scan_lag_seconds", late)
+            fresh = []
+            for symbol, interval, open_time, sig in scan([(sym, intv) for sym, intv, _ in due]):
+                scan_scheduler.done(symbol, interval, ok=sig is not None, price=sig and sig.get("price"))
+                if sig:
+                    fresh.append((symbol, interval, open_time, sig))
+                    sent += send_signal_if_new(symbol, interval, sig)
+            publish_signals(fresh)
+            duration = time.time() - started
+            metrics.observe("bitbot_sweep_seconds", duration)
+            metrics.inc("bitbot_scanned_pairs_total", len(due))
+            cycle["pairs"] += len(due)
+            cycle["signals"] += sent
+            cycle["duration"] += duration
+            if scan_scheduler.cycle_done():
+                # a candle close's pairs arrive over several batches (per-pair offsets):
+                # release one digest per chat for the whole wave
+                outbox.flush()
+                alerts.flush()
+                last_sweep_stats = dict(cycle)
+                if cycle["signals"]:
+                    print(f"Sweep: {cycle['pairs']} pairs in {cycle['duration']:.2f}s, {cycle['signals']} signals sent")
+                cycle = {"ts": 0, "pairs": 0, "signals": 0, "duration": 0.0}
         except Exception as e:
             print("Background scanner error:", e)
             time.sleep(5)
 
-threading.Thread(target=background_signal_scanner, daemon=True).start()
-
 # ============= MARKUPS =============
 def main_menu_kb():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -294,12 +752,44 @@ def back_kb():
     kb.add("⬅ Back")
     return kb
 
-# ============= BOT HANDLERS =============
-CHAT_ID = 1263295916  # make sure this matches your admin/chat
+# ============= SLOW COMMANDS =============
+# heavy previews run here instead of on the update dispatcher
+heavy_jobs = JobQueue(max_workers=int(os.environ.get("HEAVY_JOB_WORKERS", 3)))
+
+def run_heavy(m, key, compute):
+    """
+    Post a placeholder, run compute() -> text on the job pool and edit the
+    placeholder with the result. Identical in-flight requests share one run.
+    The placeholder carries no reply keyboard (Telegram won't edit messages that
+    do), so the main menu comes back with a short follow-up message.
+    """
+    placeholder = bot.send_message(m.chat.id, "⏳ Computing…")
 
+    def done(result, error):
+        text = result if error is None else f"⚠ Failed: {error}"
+        try:
+            bot.edit_message_text(text, chat_id=m.chat.id, message_id=placeholder.message_id)
+        except Exception as e:
+            print("Edit placeholder error:", e)
+        else:
+            text = "Back to menu."
+        try:
+            bot.send_message(m.chat.id, text, reply_markup=main_menu_kb())
+        except Exception as e:
+            print("Send result error:", e)
+
+    if heavy_jobs.submit(key, compute, done) == "busy":
+        done("⚠ Busy right now, try again in a minute.", None)
+
+# ============= BOT HANDLERS =============
 @bot.message_handler(commands=["start"])
 def handle_start(m):
-    bot.send_message(m.chat.id, "🤖 Bot ready. Use menu below:", reply_markup=main_menu_kb())
+    if OPEN_SIGNUP or m.chat.id in ALLOWED_CHATS:
+        subscriptions.enrol(m.chat.id)
+        bot.send_message(m.chat.id, "🤖 Bot ready. Use menu below:", reply_markup=main_menu_kb())
+    else:
+        bot.send_message(m.chat.id, "🤖 Bot ready. Add coins to get alerts for them. Use menu below:",
+                         reply_markup=main_menu_kb())
 
 # ----- Add Coin -----
 @bot.message_handler(func=lambda msg: msg.text == "➕ Add Coin")
@@ -314,8 +804,7 @@ def process_add_coin(m):
     sym = normalize_symbol(m.text)
     if not sym:
         bot.send_message(m.chat.id, "Invalid symbol. Try again.", reply_markup=main_menu_kb()); return
-    if sym not in coins:
-        coins.append(sym); save_json(USER_COINS_FILE, coins)
+    if subscriptions.add_coin(m.chat.id, sym):
         bot.send_message(m.chat.id, f"✅ Added {sym}", reply_markup=main_menu_kb())
     else:
         bot.send_message(m.chat.id, f"⚠ {sym} already present.", reply_markup=main_menu_kb())
@@ -323,6 +812,7 @@ def process_add_coin(m):
 # ----- My Coins -----
 @bot.message_handler(func=lambda msg: msg.text == "📊 My Coins")
 def cmd_my_coins(m):
+    coins = subscriptions.coins(m.chat.id)
     if not coins:
         bot.send_message(m.chat.id, "No coins added. Use Add Coin.", reply_markup=main_menu_kb())
         return
@@ -331,7 +821,7 @@ def cmd_my_coins(m):
     kb.add("⬅ Back")
     bot.send_message(m.chat.id, "Select a coin:", reply_markup=kb)
 
-@bot.message_handler(func=lambda msg: msg.text in coins)
+@bot.message_handler(func=lambda msg: msg.text in subscriptions.coins(msg.chat.id))
 def handle_coin_selected(m):
     symbol = m.text
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -344,7 +834,9 @@ def show_analysis_for(symbol, m):
     if m.text == "⬅ Back":
         bot.send_message(m.chat.id, "Back.", reply_markup=main_menu_kb()); return
     interval = m.text
-    sig = generate_combined_signal(symbol, interval)
+    sig = current_signal(symbol, interval)
+    if sig:
+        sig = rescore(sig, subscriptions.prefs(m.chat.id))
     if not sig:
         bot.send_message(m.chat.id, f"No data / no strong signal for {symbol} {interval}.", reply_markup=main_menu_kb())
     else:
@@ -363,26 +855,14 @@ def top_movers_handler(m):
     if m.text == "⬅ Back":
         bot.send_message(m.chat.id, "Back.", reply_markup=main_menu_kb()); return
     window = m.text
-    # Binance supports intervals for klines but for 24h we use ticker 24hr change percent
-    if window == "24h":
-        data = requests.get(TICKER_24HR, timeout=10).json()
-        usdt = [d for d in data if d["symbol"].endswith("USDT")]
-        top = sorted(usdt, key=lambda x: float(x.get("priceChangePercent",0)), reverse=True)[:10]
-        msg = "🚀 Top Movers 24h:\n" + "\n".join([f"{t['symbol']}: {t['priceChangePercent']}%" for t in top])
-        bot.send_message(m.chat.id, msg, reply_markup=main_menu_kb())
-        return
-    # for 5m/1h we'll compute percent change from klines
-    # map window to kline interval
-    intv = "5m" if window == "5m" else "1h"
-    top = []
-    for sym in get_top_coins(50):
-        closes = get_klines(sym, intv, limit=10)
-        if not closes or len(closes)<2: continue
-        pct = (closes[-1]-closes[0])/closes[0]*100
-        top.append((sym, pct))
-    top = sorted(top, key=lambda x: x[1], reverse=True)[:10]
-    msg = f"🚀 Top Movers {window}:\n" + "\n".join([f"{s}: {p:.2f}%" for s,p in top])
-    bot.send_message(m.chat.id, msg, reply_markup=main_menu_kb())
+    if movers.fresh():
+        bot.send_message(m.chat.id, top_movers_text(window), reply_markup=main_menu_kb())
+    else:
+        run_heavy(m, ("movers", window), lambda: top_movers_text(window))
+
+def top_movers_text(window):
+    top = movers.top(window, 10)
+    return f"🚀 Top Movers {window}:\n" + "\n".join([f"{s}: {p:.2f}%" for s,p in top])
 
 # ----- Signals ----- (submenu)
 @bot.message_handler(func=lambda msg: msg.text == "📡 Signals")
@@ -394,7 +874,7 @@ def cmd_signals_menu(m):
 
 @bot.message_handler(func=lambda msg: msg.text == "My Coins")
 def signals_mycoins(m):
-    active = coins if coins else []
+    active = subscriptions.coins(m.chat.id)
     if not active:
         bot.send_message(m.chat.id, "No coins in My Coins. Use Add Coin.", reply_markup=main_menu_kb()); return
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -425,17 +905,15 @@ def preview_universe_signals(n, m):
     if m.text == "⬅ Back":
         bot.send_message(m.chat.id, "Back", reply_markup=main_menu_kb()); return
     tf = m.text
+    prefs = subscriptions.prefs(m.chat.id)
+    run_heavy(m, ("universe", n, tf, tuple(sorted(prefs.items()))), lambda: universe_signals_text(n, tf, prefs))
+
+def universe_signals_text(n, tf, prefs=None):
     top = get_top_coins(n)
-    signals_out = []
-    for sym in top[:50]:  # limit for speed
-        s = generate_combined_signal(sym, tf)
-        if s and s["type"] in ("ULTRA BUY","ULTRA SELL","BUY","SELL"):
-            signals_out.append(f"{s['type']} {sym} | Score {s['score']}")
-        if len(signals_out) >= 20: break
+    signals_out = [f"{s['type']} {sym} | Score {s['score']}" for sym, s in batch_signals(top, tf, prefs=prefs)][:20]
     if signals_out:
-        bot.send_message(m.chat.id, "Signals:\n" + "\n".join(signals_out), reply_markup=main_menu_kb())
-    else:
-        bot.send_message(m.chat.id, "No strong signals found.", reply_markup=main_menu_kb())
+        return "Signals:\n" + "\n".join(signals_out)
+    return "No strong signals found."
 
 @bot.message_handler(func=lambda msg: msg.text == "Particular Coin")
 def signals_particular(m):
@@ -443,13 +921,12 @@ def signals_particular(m):
     bot.register_next_step_handler(msg, process_track_particular)
 
 def process_track_particular(m):
-    global tracked_single
     if m.text == "⬅ Back":
         bot.send_message(m.chat.id, "Back", reply_markup=main_menu_kb()); return
     sym = normalize_symbol(m.text)
     if not sym:
         bot.send_message(m.chat.id, "Invalid symbol", reply_markup=main_menu_kb()); return
-    tracked_single = sym
+    subscriptions.set_tracked(m.chat.id, sym)
     bot.send_message(m.chat.id, f"🔭 Now tracking {sym} (background scanner).", reply_markup=main_menu_kb())
 
 def choose_signal_action(source, m):
@@ -470,7 +947,9 @@ def preview_or_start_for(sym, m):
     if m.text == "⬅ Back":
         bot.send_message(m.chat.id, "Back", reply_markup=main_menu_kb()); return
     tf = m.text
-    s = generate_combined_signal(sym, tf)
+    s = current_signal(sym, tf)
+    if s:
+        s = rescore(s, subscriptions.prefs(m.chat.id))
     if not s:
         bot.send_message(m.chat.id, "No data / no signal.", reply_markup=main_menu_kb()); return
     bot.send_message(m.chat.id, f"{s['type']} {sym} {tf}\n{s['text']}\nScore {s['score']}", reply_markup=main_menu_kb())
@@ -478,6 +957,7 @@ def preview_or_start_for(sym, m):
 # ----- Stop Signals (mute coin) -----
 @bot.message_handler(func=lambda msg: msg.text == "🛑 Stop Signals")
 def cmd_stop_signals(m):
+    coins = subscriptions.coins(m.chat.id)
     if not coins:
         bot.send_message(m.chat.id, "No user coins saved.", reply_markup=main_menu_kb()); return
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -490,28 +970,21 @@ def process_mute_coin(m):
     if m.text == "⬅ Back":
         bot.send_message(m.chat.id, "Back", reply_markup=main_menu_kb()); return
     sym = normalize_symbol(m.text)
-    if sym and sym not in muted_coins:
-        muted_coins.append(sym)
-        save_json(MUTED_COINS_FILE, muted_coins)
+    if sym:
+        subscriptions.mute(m.chat.id, sym)
     bot.send_message(m.chat.id, f"⛔ Muted {sym}", reply_markup=main_menu_kb())
 
 # ----- Reset settings -----
 @bot.message_handler(func=lambda msg: msg.text == "🔄 Reset Settings")
 def cmd_reset(m):
-    global coins, last_signals, muted_coins, coin_intervals
-    coins = []
-    last_signals = {}
-    muted_coins = []
-    coin_intervals = {}
-    save_json(USER_COINS_FILE, coins)
-    save_json(LAST_SIGNAL_FILE, last_signals)
-    save_json(MUTED_COINS_FILE, muted_coins)
-    save_json(COIN_INTERVALS_FILE, coin_intervals)
+    subscriptions.reset(m.chat.id)
+    alerts.reset_chat(m.chat.id)
     bot.send_message(m.chat.id, "✅ All cleared.", reply_markup=main_menu_kb())
 
 # ----- Signal Settings -----
 @bot.message_handler(func=lambda msg: msg.text == "⚙ Signal Settings")
 def cmd_signal_settings(m):
+    settings = subscriptions.prefs(m.chat.id)
     bot.send_message(m.chat.id, f"Current: RSI Buy {settings['rsi_buy']}  RSI Sell {settings['rsi_sell']}  Validity(min) {settings['signal_validity_min']}  Sentiment {settings['use_sentiment']}\nSend: buy,sell,validity,use_sentiment(True/False)", reply_markup=back_kb())
     bot.register_next_step_handler_by_chat_id(m.chat.id, process_update_settings)
 
@@ -520,11 +993,12 @@ def process_update_settings(m):
         bot.send_message(m.chat.id, "Back", reply_markup=main_menu_kb()); return
     try:
         parts = [x.strip() for x in m.text.split(",")]
-        settings["rsi_buy"] = int(parts[0])
-        settings["rsi_sell"] = int(parts[1])
-        settings["signal_validity_min"] = int(parts[2])
-        settings["use_sentiment"] = parts[3].lower() in ("true","1","yes","y")
-        save_json(SETTINGS_FILE, settings)
+        subscriptions.set_settings(m.chat.id, {
+            "rsi_buy": int(parts[0]),
+            "rsi_sell": int(parts[1]),
+            "signal_validity_min": int(parts[2]),
+            "use_sentiment": parts[3].lower() in ("true","1","yes","y"),
+        })
         bot.send_message(m.chat.id, "✅ Settings updated.", reply_markup=main_menu_kb())
     except Exception:
         bot.send_message(m.chat.id, "Invalid format. Use: buy,sell,validity,True/False", reply_markup=main_menu_kb())
@@ -532,41 +1006,201 @@ def process_update_settings(m):
 # ----- Preview Signals -----
 @bot.message_handler(func=lambda msg: msg.text == "🔍 Preview Signals")
 def cmd_preview_signals(m):
-    active = coins if coins else get_top_coins(50)
+    active = subscriptions.coins(m.chat.id) or get_top_coins(50)
+    prefs = subscriptions.prefs(m.chat.id)
+    run_heavy(m, ("preview", tuple(active[:80]), tuple(sorted(prefs.items()))),
+              lambda: preview_signals_text(active, prefs))
+
+def preview_signals_text(active, prefs=None):
+    # choose a small set of intervals to preview; one vectorized pass per interval
+    by_tf = {tf: dict(batch_signals(active[:80], tf, prefs=prefs)) for tf in ["1m","5m","15m"]}
     found = []
     for sym in active[:80]:
-        # choose a small set of intervals to preview
         for tf in ["1m","5m","15m"]:
-            s = generate_combined_signal(sym, tf)
-            if s and s["type"] in ("ULTRA BUY","ULTRA SELL","BUY","SELL"):
+            s = by_tf[tf].get(sym)
+            if s:
                 found.append(f"{s['type']} {sym} {tf} | Score {s['score']}")
-            if len(found) >= 20:
-                break
-        if len(found) >= 20:
-            break
+    found = found[:20]
     if found:
-        bot.send_message(m.chat.id, "Preview signals:\n" + "\n".join(found), reply_markup=main_menu_kb())
-    else:
-        bot.send_message(m.chat.id, "No preview signals found right now.", reply_markup=main_menu_kb())
+        return "Preview signals:\n" + "\n".join(found)
+    return "No preview signals found right now."
 
 # ============= FLASK WEBHOOK =============
 @app.route("/" + BOT_TOKEN, methods=["POST"])
+@metrics.timed("bitbot_webhook_seconds")
 def webhook():
     """
-    Telegram will POST updates here. We parse and hand to pyTelegramBotAPI.
+    Telegram will POST updates here. We parse and queue them for pyTelegramBotAPI.
     """
     try:
         json_str = request.get_data().decode("utf-8")
         update = telebot.types.Update.de_json(json_str)
-        bot.process_new_updates([update])
+        update_queue.put((time.perf_counter(), update))
+        metrics.inc("bitbot_updates_total")
     except Exception as e:
         print("Webhook processing error:", e)
     return "OK", 200
 
+# updates are acknowledged right away and handled in order on this thread
+update_queue = queue.Queue()
+
+def update_dispatcher():
+    while True:
+        queued_at, update = update_queue.get()
+        metrics.observe("bitbot_update_queue_wait_seconds", time.perf_counter() - queued_at)
+        started = time.perf_counter()
+        try:
+            bot.process_new_updates([update])
+        except Exception as e:
+            print("Update dispatch error:", e)
+            metrics.inc("bitbot_update_errors_total")
+        metrics.observe("bitbot_update_seconds", time.perf_counter() - started)
+
+threading.Thread(target=update_dispatcher, daemon=True).start()
+
 @app.route("/")
 def index():
     return "BitBot running", 200
 
+# ============= METRICS =============
+metrics.describe("bitbot_kline_fetch_seconds", "Binance klines request latency")
+metrics.describe("bitbot_kline_fetch_errors_total", "Failed klines requests by symbol")
+metrics.describe("bitbot_indicator_seconds", "Indicator computation latency")
+metrics.describe("bitbot_sentiment_fetch_seconds", "CryptoPanic request latency")
+metrics.describe("bitbot_signals_total", "send_signal_if_new outcomes")
+metrics.describe("bitbot_sweep_seconds", "Scanner batch duration")
+metrics.describe("bitbot_scanned_pairs_total", "Pairs evaluated by the scanner")
+metrics.describe("bitbot_scan_lag_seconds", "How late pairs were evaluated after becoming due")
+metrics.describe("bitbot_webhook_seconds", "Webhook handler latency")
+metrics.describe("bitbot_update_queue_wait_seconds", "Time updates wait for the dispatcher")
+metrics.describe("bitbot_delivery_seconds", "Time from queuing an alert to Telegram accepting it")
+
+metrics.gauge("bitbot_update_queue_depth", "Telegram updates waiting for the dispatcher", update_queue.qsize)
+metrics.gauge("bitbot_outbox_depth", "Messages waiting to be sent", outbox.depth)
+metrics.gauge("bitbot_outbox_messages", "Outbound messages by outcome",
+              lambda: {(("result", k),): v for k, v in outbox.stats.items()})
+metrics.gauge("bitbot_market_symbols", "Tradable symbols in the exchangeInfo index", lambda: len(market.symbols))
+metrics.gauge("bitbot_market_ticker_age_seconds", "Seconds since ticker data last updated the rankings",
+              lambda: time.time() - market.tickers_at if market.tickers_at else 0)
+metrics.gauge("bitbot_alert_states", "Pairs in alert cooldown", lambda: len(alerts))
+metrics.gauge("bitbot_alert_decisions", "Alert engine decisions by outcome",
+              lambda: {(("result", k),): v for k, v in alerts.stats.items()})
+metrics.gauge("bitbot_heavy_jobs_depth", "Heavy commands running or queued", heavy_jobs.depth)
+metrics.gauge("bitbot_kline_delta_ratio", "Share of kline refreshes served by delta top-ups",
+              lambda: ratio(kline_store.stats["delta"], kline_store.stats["full"]))
+metrics.gauge("bitbot_kline_series", "Kline series held in memory", lambda: len(kline_store.series))
+metrics.gauge("bitbot_kline_refreshes", "Kline refreshes by kind (derived: built from a shorter interval)",
+              lambda: {(("kind", k),): v for k, v in kline_store.stats.items() if k != "evicted"})
+metrics.gauge("bitbot_sentiment_hit_ratio", "Sentiment cache hit ratio",
+              lambda: ratio(sentiment_cache.stats["hits"], sentiment_cache.stats["misses"]))
+metrics.gauge("bitbot_signal_cache_hit_ratio", "Signal cache hit ratio",
+              lambda: ratio(signal_cache.stats["hits"], signal_cache.stats["misses"]))
+metrics.gauge("bitbot_binance_used_weight", "Last X-MBX-USED-WEIGHT-1M reported by Binance",
+              lambda: exchange.stats["used_weight"])
+metrics.gauge("bitbot_binance_weight_limit", "Request weight the limiter allows per minute",
+              lambda: exchange.limiter.capacity)
+metrics.gauge("bitbot_binance_requests", "Binance requests by outcome",
+              lambda: {(("kind", k),): exchange.stats[k] for k in ("requests", "errors", "retries", "throttled")})
+metrics.gauge("bitbot_binance_limiter_wait_seconds", "Total time spent waiting for request weight",
+              lambda: exchange.stats["wait_sum"])
+metrics.gauge("bitbot_sweep_lag_seconds", "Seconds since the last scanner sweep started",
+              lambda: time.time() - last_sweep_stats["ts"] if last_sweep_stats["ts"] else 0)
+metrics.gauge("bitbot_scan_scheduled_pairs", "Pairs waiting in the scan scheduler", scan_scheduler.pending)
+metrics.gauge("bitbot_scan_backoff_pairs", "Pairs backing off after failed evaluations",
+              lambda: len(scan_scheduler.failures))
+metrics.gauge("bitbot_sweep_last_duration_seconds", "Duration of the last scanner sweep",
+              lambda: last_sweep_stats["duration"])
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+# PROFILER=1 enables /debug/profile?action=start|stop|report (collapsed stacks)
+profiler = SamplingProfiler() if os.environ.get("PROFILER", "").lower() in ("1", "true", "yes") else None
+
+@app.route("/debug/profile")
+def debug_profile():
+    if profiler is None:
+        return "Profiler disabled (set PROFILER=1)", 404
+    action = request.args.get("action", "report")
+    if action == "start":
+        return ("Profiler started" if profiler.start() else "Profiler already running"), 200
+    if action == "stop":
+        profiler.stop()
+        return "Profiler stopped", 200
+    top = request.args.get("top", type=int)
+    return profiler.report(top), 200, {"Content-Type": "text/plain"}
+
+# ============= WARMUP =============
+# FAST_START=1: the web path comes up first. Warmup (top coins, kline backfill, then the
+# scanner) waits for the first request or WARMUP_DELAY seconds and backfills in small
+# batches with pauses, so early webhook calls aren't starved. /ready reports progress.
+FAST_START = os.environ.get("FAST_START", "").lower() in ("1", "true", "yes")
+WARMUP_DELAY = float(os.environ.get("WARMUP_DELAY", 10))
+WARMUP_BATCH = 20
+warmup_state = {"ready": not BACKGROUND_TASKS, "started": None, "finished": None, "pairs": 0, "warmed": 0}
+startup_times = {"import": None, "first_response": None}
+first_request = threading.Event()
+
+@app.before_request
+def note_first_request():
+    first_request.set()
+
+@app.after_request
+def note_first_response(response):
+    if startup_times["first_response"] is None:
+        startup_times["first_response"] = time.perf_counter() - IMPORT_STARTED
+        print(f"First response {startup_times['first_response']:.2f}s after import started")
+    return response
+
+def warmup():
+    if FAST_START:
+        first_request.wait(WARMUP_DELAY)
+    warmup_state["started"] = time.time()
+    export_state()
+    sentiment_cache.start()
+    leader = False
+    try:
+        market.load_symbols()
+        market.start()
+        movers.start()
+        get_top_coins(50)
+        # only the process that will scan needs the candles
+        leader = SCANNER_MODE != "service" and scanner_lock.acquire()
+        if leader:
+            pairs = active_pairs()
+            warmup_state["pairs"] = len(pairs)
+            with ThreadPoolExecutor(max_workers=max(1, SCAN_MAX_WORKERS)) as pool:
+                for i in range(0, len(pairs), WARMUP_BATCH):
+                    batch = pairs[i:i + WARMUP_BATCH]
+                    list(pool.map(lambda pair: kline_store.refresh(pair[0], pair[1], 200), batch))
+                    warmup_state["warmed"] += len(batch)
+                    if FAST_START:
+                        time.sleep(0.2)  # leave room for the web path
+    except Exception as e:
+        print("Warmup error:", e)
+    warmup_state["finished"] = time.time()
+    warmup_state["ready"] = True
+    print(f"Warmup done: {warmup_state['warmed']} pairs in {warmup_state['finished'] - warmup_state['started']:.1f}s")
+    if SCANNER_MODE != "service":
+        run_scanner(leader=leader)
+
+@app.route("/ready")
+def ready():
+    body = dict(warmup_state, import_seconds=startup_times["import"],
+                first_response_seconds=startup_times["first_response"])
+    return json.dumps(body), (200 if warmup_state["ready"] else 503), {"Content-Type": "application/json"}
+
+metrics.gauge("bitbot_ready", "1 once warmup has finished", lambda: int(warmup_state["ready"]))
+metrics.gauge("bitbot_import_seconds", "Time to import the bot module", lambda: startup_times["import"] or 0)
+metrics.gauge("bitbot_first_response_seconds", "Time from import to the first HTTP response",
+              lambda: startup_times["first_response"] or 0)
+metrics.gauge("bitbot_warmup_pairs", "Pairs backfilled during warmup", lambda: warmup_state["warmed"])
+
+if BACKGROUND_TASKS:
+    threading.Thread(target=warmup, daemon=True).start()
+startup_times["import"] = time.perf_counter() - IMPORT_STARTED
+
 # ============= STARTUP =============
 def set_webhook():
     try:
@@ -580,12 +1214,10 @@ def set_webhook():
         print("Failed to set webhook:", e)
 
 if __name__ == "__main__":
-    # ensure saved state exists
-    save_json(USER_COINS_FILE, coins)
-    save_json(SETTINGS_FILE, settings)
-    save_json(LAST_SIGNAL_FILE, last_signals)
-    save_json(MUTED_COINS_FILE, muted_coins)
-    save_json(COIN_INTERVALS_FILE, coin_intervals)
+    # ensure saved state exists (and the JSON copies are current)
+    state.put_many("settings", settings)
+    state.bump("settings")
+    export_state()
     # set webhook and run flask
     set_webhook()
     port = int(os.environ.get("PORT", 10000))
@@ -0,0 +1,261 @@
+import threading
+
+import numpy as np
+
+def ema_alpha(period):
+    # same smoothing as pandas ewm(span=period, adjust=False)
+    return 2.0 / (period + 1)
+
+def rsi_from_averages(avg_gain, avg_loss):
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else 50.0
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+def rsi_wilder(closes, period=14):
+    """
+    Wilder RSI of the last close: SMA seed over the first `period` deltas, then
+    avg = (avg * (period - 1) + x) / period. Returns None if there is not enough data.
+    """
+    arr = np.asarray(closes, dtype=np.float64)
+    if len(arr) < period + 1:
+        return None
+    delta = np.diff(arr)
+    up = np.where(delta > 0, delta, 0.0)
+    down = np.where(delta < 0, -delta, 0.0)
+    avg_gain = up[:period].mean()
+    avg_loss = down[:period].mean()
+    for g, l in zip(up[period:].tolist(), down[period:].tolist()):
+        avg_gain = (avg_gain * (period - 1) + g) / period
+        avg_loss = (avg_loss * (period - 1) + l) / period
+    return float(rsi_from_averages(avg_gain, avg_loss))
+
+class IndicatorState:
+    """
+    Running RSI/EMA/MACD state for one (symbol, interval).
+
+    update() folds in a closed candle in O(1); peek() returns the indicator values as
+    if the still-open candle closed at the given price, without committing it.
+    """
+    def __init__(self, rsi_period=14, ema_period=50, fast=12, slow=26, signal=9):
+        self.rsi_period = rsi_period
+        self.a_ema = ema_alpha(ema_period)
+        self.a_fast = ema_alpha(fast)
+        self.a_slow = ema_alpha(slow)
+        self.a_signal = ema_alpha(signal)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.n = 0                  # closed candles folded in
+        self.last_open_time = None  # open time of the last closed candle
+        self.prev_close = None
+        self.gain_sum = 0.0         # used until the first Wilder average exists
+        self.loss_sum = 0.0
+        self.avg_gain = None
+        self.avg_loss = None
+        self.ema = None
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal = None
+
+    def _step(self, close):
+        """Return the state fields after folding in `close` (does not mutate self)."""
+        p = self.rsi_period
+        gain_sum, loss_sum = self.gain_sum, self.loss_sum
+        avg_gain, avg_loss = self.avg_gain, self.avg_loss
+        if self.prev_close is not None:
+            d = close - self.prev_close
+            g = d if d > 0 else 0.0
+            l = -d if d < 0 else 0.0
+            if avg_gain is None:
+                gain_sum += g
+                loss_sum += l
+                if self.n == p:  # n closes -> n-1 deltas; this is delta number p
+                    avg_gain, avg_loss = gain_sum / p, loss_sum / p
+            else:
+                avg_gain = (avg_gain * (p - 1) + g) / p
+                avg_loss = (avg_loss * (p - 1) + l) / p
+        if self.ema is None:
+            ema = ema_fast = ema_slow = close
+            macd_signal = 0.0
+        else:
+            ema = self.ema + self.a_ema * (close - self.ema)
+            ema_fast = self.ema_fast + self.a_fast * (close - self.ema_fast)
+            ema_slow = self.ema_slow + self.a_slow * (close - self.ema_slow)
+            macd = ema_fast - ema_slow
+            macd_signal = self.macd_signal + self.a_signal * (macd - self.macd_signal)
+        return gain_sum, loss_sum, avg_gain, avg_loss, ema, ema_fast, ema_slow, macd_signal
+
+    def update(self, close, open_time=None):
+        """Fold in one closed candle."""
+        close = float(close)
+        (self.gain_sum, self.loss_sum, self.avg_gain, self.avg_loss,
+         self.ema, self.ema_fast, self.ema_slow, self.macd_signal) = self._step(close)
+        self.prev_close = close
+        self.n += 1
+        if open_time is not None:
+            self.last_open_time = int(open_time)
+
+    def peek(self, close):
+        """
+        Indicator values with the open candle at `close`:
+        {"price", "rsi", "ema50", "macd", "macd_signal"}. rsi is None until warmed up.
+        """
+        close = float(close)
+        _, _, avg_gain, avg_loss, ema, ema_fast, ema_slow, macd_signal = self._step(close)
+        rsi = None
+        if avg_gain is not None:
+            rsi = float(rsi_from_averages(avg_gain, avg_loss))
+        return {"price": close, "rsi": rsi, "ema50": ema,
+                "macd": ema_fast - ema_slow, "macd_signal": macd_signal}
+
+    def seed(self, closes, open_times=None):
+        """Rebuild the state from history (closed candles only)."""
+        self.reset()
+        for i, c in enumerate(closes):
+            self.update(c, None if open_times is None else open_times[i])
+
+    def sync(self, open_times, closes):
+        """
+        Catch up with a candle window whose last entry is the still-open candle and
+        return peek() of it. Newly closed candles are folded in one by one; if the
+        window does not overlap what was already folded in, the state is reseeded.
+        """
+        with self.lock:
+            n_closed = len(closes) - 1
+            if n_closed <= 0:
+                return None
+            if self.last_open_time is None:
+                self.seed(closes[:n_closed], open_times[:n_closed])
+            else:
+                pos = np.searchsorted(open_times[:n_closed], self.last_open_time)
+                if pos >= n_closed or int(open_times[pos]) != self.last_open_time:
+                    self.seed(closes[:n_closed], open_times[:n_closed])
+                else:
+                    for i in range(pos + 1, n_closed):
+                        self.update(closes[i], open_times[i])
+            return self.peek(closes[-1])
+
+def indicator_score(rsi, macd, macd_signal, ema50, price, rsi_buy=25, rsi_sell=75):
+    """Integer score from RSI extremes, MACD momentum and price vs EMA50 (no sentiment)."""
+    score = 0
+    if rsi is not None:
+        if rsi < rsi_buy:
+            score += 2
+        elif rsi < rsi_buy + 10:
+            score += 1
+        if rsi > rsi_sell:
+            score -= 2
+        elif rsi > rsi_sell - 10:
+            score -= 1
+    if macd is not None and macd_signal is not None:
+        score += 1 if macd > macd_signal else -1
+    score += 1 if price > ema50 else -1
+    return score
+
+def signal_type(score):
+    if score >= 4:
+        return "ULTRA BUY"
+    if score >= 2:
+        return "BUY"
+    if score <= -4:
+        return "ULTRA SELL"
+    if score <= -2:
+        return "SELL"
+    return "HOLD"
+
+BATCH_DTYPE = np.dtype([("price", "f8"), ("rsi", "f8"), ("ema50", "f8"),
+                        ("macd", "f8"), ("macd_signal", "f8"), ("score", "i4")])
+
+def score_batch(closes, rsi_buy=25, rsi_sell=75, rsi_period=14, ema_period=50,
+                fast=12, slow=26, signal=9):
+    """
+    Score every row of a (symbols x candles) close matrix in one pass.
+
+    Same indicators and thresholds as indicator_score(); the time axis is walked once
+    while every update is vectorized across symbols. Returns a BATCH_DTYPE record per
+    row; rsi is NaN (and contributes nothing) when there are too few candles.
+    """
+    c = np.asarray(closes, dtype=np.float64)
+    if c.ndim != 2:
+        raise ValueError("closes must be 2-D (symbols x candles)")
+    m, n = c.shape
+    a_ema, a_fast, a_slow, a_sig = (ema_alpha(p) for p in (ema_period, fast, slow, signal))
+    ema = c[:, 0].copy()
+    ema_f = ema.copy()
+    ema_s = ema.copy()
+    sig = np.zeros(m)
+    delta = np.diff(c, axis=1)
+    up = np.where(delta > 0, delta, 0.0)
+    down = np.where(delta < 0, -delta, 0.0)
+    avg_gain = avg_loss = None
+    if n > rsi_period:
+        avg_gain = up[:, :rsi_period].mean(axis=1)
+        avg_loss = down[:, :rsi_period].mean(axis=1)
+    for j in range(1, n):
+        x = c[:, j]
+        ema += a_ema * (x - ema)
+        ema_f += a_fast * (x - ema_f)
+        ema_s += a_slow * (x - ema_s)
+        sig += a_sig * ((ema_f - ema_s) - sig)
+        if avg_gain is not None and j > rsi_period:
+            avg_gain = (avg_gain * (rsi_period - 1) + up[:, j - 1]) / rsi_period
+            avg_loss = (avg_loss * (rsi_period - 1) + down[:, j - 1]) / rsi_period
+
+    out = np.zeros(m, dtype=BATCH_DTYPE)
+    out["price"] = c[:, -1]
+    out["ema50"] = ema
+    out["macd"] = ema_f - ema_s
+    out["macd_signal"] = sig
+    if avg_gain is None:
+        rsi = np.full(m, np.nan)
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+        rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), rsi)
+    out["rsi"] = rsi
+
+    out["score"] = score_arrays(rsi, out["macd"], sig, ema, out["price"], rsi_buy, rsi_sell)
+    return out
+
+def score_arrays(rsi, macd, macd_signal, ema50, price, rsi_buy=25, rsi_sell=75):
+    """Element-wise indicator_score() over arrays; NaN RSI contributes nothing."""
+    score = np.zeros(np.shape(price), dtype=np.int32)
+    score += np.where(rsi < rsi_buy, 2, np.where(rsi < rsi_buy + 10, 1, 0)).astype(np.int32)
+    score -= np.where(rsi > rsi_sell, 2, np.where(rsi > rsi_sell - 10, 1, 0)).astype(np.int32)
+    score += np.where(macd > macd_signal, 1, -1).astype(np.int32)
+    score += np.where(price > ema50, 1, -1).astype(np.int32)
+    return score
+
+def signal_types(score):
+    """Vectorized signal_type(): array of 2 ULTRA BUY, 1 BUY, 0 HOLD, -1 SELL, -2 ULTRA SELL."""
+    return np.select([score >= 4, score >= 2, score <= -4, score <= -2], [2, 1, -2, -1], 0)
+
+SIGNAL_CODES = {2: "ULTRA BUY", 1: "BUY", 0: "HOLD", -1: "SELL", -2: "ULTRA SELL"}
+
+def indicator_history(closes, rsi_period=14, ema_period=50, fast=12, slow=26, signal=9):
+    """
+    RSI/EMA50/MACD/signal at every candle of one series (same values IndicatorState
+    would produce candle by candle), computed with pandas' C-level ewm.
+    Returns {"rsi", "ema50", "macd", "macd_signal"} arrays; rsi is NaN during warm-up.
+    """
+    import pandas as pd  # only needed for full-history work (backtests)
+    c = pd.Series(np.asarray(closes, dtype=np.float64))
+    ema = c.ewm(span=ema_period, adjust=False).mean().to_numpy()
+    macd = (c.ewm(span=fast, adjust=False).mean() - c.ewm(span=slow, adjust=False).mean())
+    sig = macd.ewm(span=signal, adjust=False).mean().to_numpy()
+    rsi = np.full(len(c), np.nan)
+    if len(c) > rsi_period:
+        delta = np.diff(c.to_numpy())
+        avgs = []
+        for x in (np.where(delta > 0, delta, 0.0), np.where(delta < 0, -delta, 0.0)):
+            # Wilder smoothing == ewm(alpha=1/period) seeded with the SMA of the first period deltas
+            seeded = x[rsi_period - 1:].copy()
+            seeded[0] = x[:rsi_period].mean()
+            avgs.append(pd.Series(seeded).ewm(alpha=1.0 / rsi_period, adjust=False).mean().to_numpy())
+        gain, loss = avgs
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = 100 - 100 / (1 + gain / loss)
+        rsi[rsi_period:] = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), r)
+    return {"rsi": rsi, "ema50": ema, "macd": macd.to_numpy(), "macd_signal": sig}
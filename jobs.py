@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class JobQueue:
+    """
+    Bounded worker pool for slow bot commands, with de-duplication: while a job
+    with a given key is running, further submits for that key only attach their
+    callback and get the same result.
+    """
+    def __init__(self, max_workers=4, max_pending=16):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_pending = max_pending
+        self.inflight = {}  # key -> [callback, ...]
+        self.lock = threading.Lock()
+        self.stats = {"started": 0, "joined": 0, "rejected": 0, "failed": 0}
+
+    def depth(self):
+        with self.lock:
+            return len(self.inflight)
+
+    def submit(self, key, fn, callback):
+        """
+        Run fn() on the pool and call callback(result, error) when it finishes.
+        Returns "started", "joined" (same key already running) or "busy" (queue full,
+        callback will not be called).
+        """
+        with self.lock:
+            if key in self.inflight:
+                self.inflight[key].append(callback)
+                self.stats["joined"] += 1
+                return "joined"
+            if len(self.inflight) >= self.max_pending:
+                self.stats["rejected"] += 1
+                return "busy"
+            self.inflight[key] = [callback]
+            self.stats["started"] += 1
+        self.pool.submit(self._run, key, fn)
+        return "started"
+
+    def _run(self, key, fn):
+        result, error = None, None
+        try:
+            result = fn()
+        except Exception as e:
+            error = e
+            self.stats["failed"] += 1
+        with self.lock:
+            callbacks = self.inflight.pop(key, [])
+        for cb in callbacks:
+            try:
+                cb(result, error)
+            except Exception as e:
+                print("Job callback error:", e)
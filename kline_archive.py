@@ -0,0 +1,123 @@
+import fcntl
+import os
+import threading
+
+import numpy as np
+
+from kline_store import FIELDS
+
+# one raw little-endian file per column: <root>/<SYMBOL>/<interval>/<column>.bin
+COLUMNS = (("open_time", np.dtype("<i8")),) + tuple((f, np.dtype("<f8")) for f in FIELDS)
+
+class KlineArchive:
+    """
+    Append-only on-disk store of closed candles per (symbol, interval), in columnar
+    fixed-width files that are read back through np.memmap (slices are zero-copy).
+
+    Several processes (web workers, the scanner, scanner shards) append to the same
+    files, so appends hold an flock on the series' .lock file and re-read the file
+    sizes and the last open_time from disk under it. Readers see the rows present
+    in every column. A torn append (crash between column writes) is repaired by the
+    next append, which truncates every column to the shortest one.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.maps = {}      # (symbol, interval) -> {column: memmap}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    def _path(self, symbol, interval, col):
+        return os.path.join(self._dir(symbol, interval), col + ".bin")
+
+    def _series_lock(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def _sizes(self, key):
+        sizes = []
+        for col, dt in COLUMNS:
+            try:
+                sizes.append(os.path.getsize(self._path(*key, col)) // dt.itemsize)
+            except OSError:
+                sizes.append(0)
+        return sizes
+
+    def _length_locked(self, key):
+        # complete rows only: a concurrent append may be between column writes
+        return min(self._sizes(key))
+
+    def _repair_locked(self, key):
+        """Truncate every column to the shortest one. Needs the series' file lock."""
+        sizes = self._sizes(key)
+        n = min(sizes)
+        if n != max(sizes):
+            for col, dt in COLUMNS:
+                path = self._path(*key, col)
+                if os.path.exists(path):
+                    with open(path, "r+b") as f:
+                        f.truncate(n * dt.itemsize)
+        return n
+
+    def length(self, symbol, interval):
+        key = (symbol, interval)
+        with self._series_lock(key):
+            return self._length_locked(key)
+
+    def append(self, symbol, interval, open_time, cols):
+        """
+        Append candles (arrays ordered by open time). Rows not newer than the last
+        archived candle are skipped. Returns the number of rows written.
+        """
+        key = (symbol, interval)
+        open_time = np.asarray(open_time, dtype=np.int64)
+        os.makedirs(self._dir(*key), exist_ok=True)
+        with self._series_lock(key), open(os.path.join(self._dir(*key), ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # sizes and the last open_time come from disk: other processes append too
+            n = self._repair_locked(key)
+            last = None
+            if n:
+                with open(self._path(*key, "open_time"), "rb") as f:
+                    f.seek((n - 1) * 8)
+                    last = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+            # strictly increasing after the archived tail (drops repeats within the batch too)
+            prev = np.maximum.accumulate(np.r_[np.iinfo(np.int64).min if last is None else last, open_time])
+            keep = open_time > prev[:-1]
+            if not keep.any():
+                return 0
+            for col, dt in COLUMNS:
+                src = open_time if col == "open_time" else cols[col]
+                data = np.asarray(src)[keep].astype(dt, copy=False)
+                with open(self._path(*key, col), "ab") as f:
+                    f.write(data.tobytes())
+            self.maps.pop(key, None)
+            return int(keep.sum())
+
+    def _map_locked(self, key, n):
+        maps = self.maps.get(key)
+        if maps is None or len(maps["open_time"]) != n:
+            maps = {col: np.memmap(self._path(*key, col), dtype=dt, mode="r", shape=(n,))
+                    for col, dt in COLUMNS}
+            self.maps[key] = maps
+        return maps
+
+    def read(self, symbol, interval, n=None, fields=("open_time", "close")):
+        """
+        Last n archived candles (all if n is None) as {column: read-only memmap view},
+        or None if nothing is archived.
+        """
+        key = (symbol, interval)
+        with self._series_lock(key):
+            total = self._length_locked(key)
+            if total == 0:
+                return None
+            maps = self._map_locked(key, total)
+        start = 0 if n is None else max(0, total - n)
+        return {f: maps[f][start:] for f in fields}
+
+    def last_open_time(self, symbol, interval):
+        snap = self.read(symbol, interval, 1, ("open_time",))
+        return None if snap is None else int(snap["open_time"][-1])
@@ -0,0 +1,326 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# candle length per Binance interval, in milliseconds
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000,
+    "1w": 604_800_000, "1M": 2_678_400_000,
+}
+
+# Binance kline row columns kept in the buffers
+FIELDS = ("open", "high", "low", "close", "volume")
+
+# interval -> the shorter interval it can be built from (UTC-aligned buckets, each
+# one a whole number of source candles); chained down to 1m
+DERIVED_FROM = {"3m": "1m", "5m": "1m", "15m": "5m", "30m": "15m", "1h": "15m",
+                "2h": "1h", "4h": "1h", "6h": "1h", "8h": "4h", "12h": "4h", "1d": "1h"}
+
+def aggregate_rows(open_time, cols, step, src_step, limit):
+    """
+    The last `limit` candles of length `step` built from consecutive `src_step`
+    candles, as Binance rows [open_time, open, high, low, close, volume]; the newest
+    one is open if the source's is. None if the source doesn't fully cover them.
+    """
+    ot = np.asarray(open_time, dtype=np.int64)
+    if len(ot) == 0 or (np.diff(ot) != src_step).any():
+        return None
+    bucket = ot - ot % step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    if ot[0] != bucket[0]:
+        starts = starts[1:]  # the oldest bucket is cut off by the window
+    if len(starts) < limit:
+        return None
+    starts = starts[len(starts) - limit:]
+    first = starts[0]
+    at = starts - first
+    ends = np.r_[starts[1:], len(ot)] - 1
+    high = np.maximum.reduceat(cols["high"][first:], at)
+    low = np.minimum.reduceat(cols["low"][first:], at)
+    volume = np.add.reduceat(cols["volume"][first:], at)
+    return [[int(bucket[i]), float(cols["open"][i]), float(h), float(lo), float(cols["close"][e]), float(v)]
+            for i, e, h, lo, v in zip(starts.tolist(), ends.tolist(), high, low, volume)]
+
+class KlineSeries:
+    """
+    Fixed-size ring buffer of candles for one (symbol, interval), ordered by open time.
+    The newest slot is usually the still-open candle and gets overwritten in place.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.open_time = np.zeros(capacity, dtype=np.int64)
+        self.cols = {f: np.zeros(capacity, dtype=np.float64) for f in FIELDS}
+        self.start = 0
+        self.count = 0
+        self.last_used = time.time()
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    def _slot(self, i):
+        # i-th candle in chronological order -> buffer index
+        return (self.start + i) % self.capacity
+
+    def last_open_time(self):
+        if self.count == 0:
+            return None
+        return int(self.open_time[self._slot(self.count - 1)])
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    def merge(self, rows):
+        """
+        Merge raw Binance kline rows. Rows older than the buffer are dropped,
+        the row matching the newest open time replaces it, newer rows are appended.
+        """
+        for row in rows:
+            ot = int(row[0])
+            last = self.last_open_time()
+            if last is not None and ot < last:
+                continue
+            if last is not None and ot == last:
+                idx = self._slot(self.count - 1)
+            elif self.count < self.capacity:
+                idx = self._slot(self.count)
+                self.count += 1
+            else:
+                idx = self.start
+                self.start = (self.start + 1) % self.capacity
+            self.open_time[idx] = ot
+            for j, f in enumerate(FIELDS):
+                self.cols[f][idx] = float(row[j + 1])
+
+    def load(self, open_time, cols):
+        """Replace the contents with arrays ordered by open time (keeps the newest capacity)."""
+        n = min(len(open_time), self.capacity)
+        self.start = 0
+        self.count = n
+        self.open_time[:n] = open_time[len(open_time) - n:]
+        for f in FIELDS:
+            self.cols[f][:n] = cols[f][len(open_time) - n:]
+
+    def tail(self, field, n):
+        """Last n values of a column (or open_time), oldest first."""
+        n = min(n, self.count)
+        idx = (self.start + self.count - n + np.arange(n)) % self.capacity
+        src = self.open_time if field == "open_time" else self.cols[field]
+        return src[idx]
+
+class KlineStore:
+    """
+    In-memory candle cache keyed by (symbol, interval).
+
+    The first request for a series fills it with one full fetch; later requests only
+    pull the few candles that changed since (limit=2..5 in steady state). Idle series
+    are evicted in LRU order once more than max_series are held or after max_idle seconds.
+
+    fetch_raw(symbol, interval, limit) must return Binance kline rows or None.
+    With an `archive` (KlineArchive), empty series are first loaded from disk and
+    every closed candle that passes through is appended to it.
+
+    With `derive` (e.g. DERIVED_FROM), top-ups of the higher intervals are built from
+    the shorter series in memory instead of fetched, so one 1m series feeds 5m, 15m,
+    1h and 1d; only fills deeper than the source buffer go to fetch_raw. A source
+    refreshed less than `fresh_for` seconds ago is used as is, so pairs of one symbol
+    scanned together share one 1m fetch.
+    """
+    def __init__(self, fetch_raw, capacity=500, max_series=400, max_idle=3600, min_delta=2,
+                 archive=None, derive=None, fresh_for=1.0):
+        self.fetch_raw = fetch_raw
+        self.archive = archive
+        self.derive = derive or {}
+        self.fresh_for = fresh_for
+        self.capacity = capacity
+        self.max_series = max_series
+        self.max_idle = max_idle
+        self.min_delta = min_delta
+        self.series = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"full": 0, "delta": 0, "evicted": 0, "warm": 0, "derived": 0, "reused": 0}
+
+    def _get_series(self, key):
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = KlineSeries(self.capacity)
+                self.series[key] = s
+            self.series.move_to_end(key)
+            s.last_used = time.time()
+            self._evict_locked()
+            return s
+
+    def _evict_locked(self):
+        now = time.time()
+        while len(self.series) > self.max_series:
+            self.series.popitem(last=False)
+            self.stats["evicted"] += 1
+        # OrderedDict is in LRU order, so stop at the first series still in use
+        for key in list(self.series.keys()):
+            if now - self.series[key].last_used <= self.max_idle:
+                break
+            del self.series[key]
+            self.stats["evicted"] += 1
+
+    def _delta_limit(self, s, interval, limit):
+        """
+        Number of candles to request to bring s up to date, or None if a full refill is needed.
+        """
+        step = INTERVAL_MS.get(interval)
+        if s.count == 0 or not step:
+            return None
+        elapsed = int(time.time() * 1000) - s.last_open_time()
+        missed = max(0, elapsed // step)
+        need = max(self.min_delta, missed + 1)
+        # the first delta row overlaps the newest buffered candle
+        if need >= s.count or s.count + need - 1 < limit:
+            return None
+        return need
+
+    def refresh(self, symbol, interval, limit=200, max_age=0):
+        """
+        Bring the series up to date and return it, or None if the fetch failed.
+        A series refreshed less than max_age seconds ago is returned without a fetch.
+        """
+        s = self._get_series((symbol, interval))
+        with s.lock:
+            if max_age and s.count >= limit and time.time() - s.refreshed_at < max_age:
+                self.stats["reused"] += 1
+                return s
+            if s.count == 0 and self.archive is not None:
+                self._warm_start(symbol, interval, s)
+            delta = self._delta_limit(s, interval, limit)
+            if delta is None:
+                rows = self._fetch(symbol, interval, limit)
+                if not rows:
+                    return None
+                s.clear()
+                s.merge(rows)
+                s.refreshed_at = time.time()
+                self.stats["full"] += 1
+                self._archive_closed(symbol, interval, s, len(rows))
+                return s
+            rows = self._fetch(symbol, interval, delta)
+            if not rows:
+                return None
+            step = INTERVAL_MS[interval]
+            if int(rows[0][0]) > s.last_open_time() + step:
+                # gap between buffer and delta (e.g. long pause) -> refill
+                rows = self._fetch(symbol, interval, limit)
+                if not rows:
+                    return None
+                s.clear()
+                self.stats["full"] += 1
+            else:
+                self.stats["delta"] += 1
+            s.merge(rows)
+            s.refreshed_at = time.time()
+            self._archive_closed(symbol, interval, s, len(rows))
+            return s
+
+    def _fetch(self, symbol, interval, limit):
+        rows = self._derive(symbol, interval, limit) if interval in self.derive else None
+        if rows is not None:
+            self.stats["derived"] += 1
+            return rows
+        return self.fetch_raw(symbol, interval, limit)
+
+    def _derive(self, symbol, interval, limit):
+        """
+        `limit` candles of interval built from its source series, or None when the
+        source buffer can't hold that much history (a fill: fetch it directly).
+        """
+        src = self.derive[interval]
+        step, src_step = INTERVAL_MS[interval], INTERVAL_MS[src]
+        # +1 bucket: the oldest one in the source window is usually partial
+        n = (limit + 1) * (step // src_step)
+        if n > self.capacity:
+            return None
+        s = self.refresh(symbol, src, n, max_age=self.fresh_for)
+        if s is None:
+            return None
+        with s.lock:
+            snap = {f: s.tail(f, n) for f in ("open_time",) + FIELDS}
+        return aggregate_rows(snap["open_time"], snap, step, src_step, limit)
+
+    def _warm_start(self, symbol, interval, s):
+        try:
+            snap = self.archive.read(symbol, interval, self.capacity, ("open_time",) + FIELDS)
+        except Exception as e:
+            print("Kline archive read error:", symbol, interval, e)
+            return
+        if snap is not None:
+            s.load(snap["open_time"], snap)
+            self.stats["warm"] += 1
+
+    def _archive_closed(self, symbol, interval, s, n):
+        """Append the closed candles among the last n to the archive."""
+        step = INTERVAL_MS.get(interval)
+        if self.archive is None or not step:
+            return
+        ot = s.tail("open_time", n)
+        closed = ot + step <= int(time.time() * 1000)
+        if not closed.any():
+            return
+        try:
+            self.archive.append(symbol, interval, ot[closed], {f: s.tail(f, n)[closed] for f in FIELDS})
+        except Exception as e:
+            print("Kline archive write error:", symbol, interval, e)
+
+    def get(self, symbol, interval, field="close", limit=200):
+        """
+        Return the last `limit` values of `field` as a NumPy array, or None on error.
+        """
+        if limit > self.capacity:
+            rows = self.fetch_raw(symbol, interval, limit)
+            if not rows:
+                return None
+            if field == "open_time":
+                return np.array([int(r[0]) for r in rows], dtype=np.int64)
+            j = FIELDS.index(field) + 1
+            return np.array([float(r[j]) for r in rows], dtype=np.float64)
+        s = self.refresh(symbol, interval, limit)
+        if s is None:
+            return None
+        with s.lock:
+            return s.tail(field, limit).copy()
+
+    def push(self, symbol, interval, row, force=False):
+        """
+        Merge one streamed kline row. Returns False (and merges nothing) if the row
+        does not follow the buffered candles; force=True restarts the series from it.
+        """
+        s = self._get_series((symbol, interval))
+        step = INTERVAL_MS.get(interval)
+        with s.lock:
+            last = s.last_open_time()
+            if last is not None and int(row[0]) > last + (step or 0):
+                if not force:
+                    return False
+                s.clear()
+            s.merge([row])
+            self._archive_closed(symbol, interval, s, 2)
+            return True
+
+    def snapshot(self, symbol, interval, limit=200, fields=("open_time", "close"), fetch=True):
+        """
+        Like get() for several columns at once (one refresh): {field: array} or None.
+        With fetch=False only what is already buffered is returned (push mode).
+        """
+        if fetch:
+            s = self.refresh(symbol, interval, limit)
+        else:
+            with self.lock:
+                s = self.series.get((symbol, interval))
+        if s is None:
+            return None
+        with s.lock:
+            return {f: s.tail(f, limit).copy() for f in fields}
+
+    def drop(self, symbol, interval):
+        with self.lock:
+            self.series.pop((symbol, interval), None)
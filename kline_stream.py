@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443"
+MAX_STREAMS_PER_CONN = 200  # keeps the combined-stream URL short; Binance allows 1024
+
+def stream_name(symbol, interval):
+    return f"{symbol.lower()}@kline_{interval}"
+
+def parse_kline_message(raw):
+    """
+    Parse a combined-stream kline message into (symbol, interval, row, closed),
+    where row is a REST-style [open_time, open, high, low, close, volume]. None otherwise.
+    """
+    try:
+        msg = json.loads(raw)
+        data = msg.get("data", msg)
+        if data.get("e") != "kline":
+            return None
+        k = data["k"]
+        row = [int(k["t"]), k["o"], k["h"], k["l"], k["c"], k["v"]]
+        return data["s"], k["i"], row, bool(k.get("x"))
+    except Exception:
+        return None
+
+class KlineStream:
+    """
+    Push-mode kline ingestion over Binance combined streams.
+
+    Every message is merged into `store` (a KlineStore) and then passed to
+    on_candle(symbol, interval, closed). After a (re)connect, and whenever a pushed
+    candle does not follow the buffered ones, the series is backfilled over REST.
+    Needs the optional websocket-client package; start() returns False without it.
+    """
+    def __init__(self, store, on_candle, base_url=BINANCE_WS_URL, limit=200):
+        self.store = store
+        self.on_candle = on_candle
+        self.base_url = base_url.rstrip("/")
+        self.limit = limit
+        self.pairs = set()
+        self.generation = 0       # bumped on every subscription change
+        self.lock = threading.Lock()
+        self.running = False
+        self.stats = {"messages": 0, "reconnects": 0, "backfills": 0}
+
+    def start(self):
+        try:
+            import websocket  # noqa: F401  (websocket-client)
+        except ImportError:
+            print("KlineStream: websocket-client not installed, staying on REST polling")
+            return False
+        self.running = True
+        return True
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            self.generation += 1
+
+    def set_pairs(self, pairs):
+        """
+        Subscribe to exactly these (symbol, interval) pairs. Connections are rebuilt
+        only if the set changed.
+        """
+        pairs = set(pairs)
+        with self.lock:
+            if not self.running or pairs == self.pairs:
+                return
+            self.pairs = pairs
+            self.generation += 1
+            gen = self.generation
+            ordered = sorted(pairs)
+        for i in range(0, len(ordered), MAX_STREAMS_PER_CONN):
+            chunk = ordered[i:i + MAX_STREAMS_PER_CONN]
+            threading.Thread(target=self._run, args=(gen, chunk), daemon=True).start()
+
+    def _current(self, gen):
+        return self.running and gen == self.generation
+
+    def _backfill(self, symbol, interval, row=None):
+        self.stats["backfills"] += 1
+        if self.store.refresh(symbol, interval, self.limit) is None and row is not None:
+            # REST unreachable: restart the series from the stream itself
+            self.store.push(symbol, interval, row, force=True)
+
+    def _run(self, gen, chunk):
+        import websocket
+        url = self.base_url + "/stream?streams=" + "/".join(stream_name(s, i) for s, i in chunk)
+        backoff = 1
+        while self._current(gen):
+            ws = None
+            try:
+                ws = websocket.create_connection(url, timeout=30)
+                backoff = 1
+                # fill anything missed while disconnected
+                for sym, intv in chunk:
+                    if not self._current(gen):
+                        break
+                    self._backfill(sym, intv)
+                while self._current(gen):
+                    parsed = parse_kline_message(ws.recv())
+                    if not parsed:
+                        continue
+                    sym, intv, row, closed = parsed
+                    self.stats["messages"] += 1
+                    if not self.store.push(sym, intv, row):
+                        self._backfill(sym, intv, row)
+                    try:
+                        self.on_candle(sym, intv, closed)
+                    except Exception as e:
+                        print("KlineStream callback error:", e)
+            except Exception as e:
+                if self._current(gen):
+                    print("KlineStream error, reconnecting:", e)
+                    self.stats["reconnects"] += 1
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+            finally:
+                if ws is not None:
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from bisect import bisect_left, insort
+
+EXCHANGE_INFO_URL = "https://api.binance.com/api/v3/exchangeInfo"
+EXCHANGE_INFO_WEIGHT = 20
+TICKER_24HR_URL = "https://api.binance.com/api/v3/ticker/24hr"
+TICKER_24HR_WEIGHT = 80
+MINI_TICKER_STREAM = "/ws/!miniTicker@arr"  # changed symbols' 24h stats, once per second
+
+class Ranking:
+    """
+    Symbols ordered by a value, best first, kept sorted as values change: an update
+    is a bisect + list insert/delete, top(k) is a slice.
+    """
+    def __init__(self):
+        self.keys = []     # (-value, symbol), ascending
+        self.values = {}
+
+    def update(self, symbol, value):
+        old = self.values.get(symbol)
+        if old == value:
+            return
+        if old is not None:
+            del self.keys[bisect_left(self.keys, (-old, symbol))]
+        insort(self.keys, (-value, symbol))
+        self.values[symbol] = value
+
+    def remove(self, symbol):
+        old = self.values.pop(symbol, None)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, (-old, symbol))]
+
+    def top(self, k):
+        return [(s, -v) for v, s in self.keys[:k]]
+
+    def __len__(self):
+        return len(self.keys)
+
+def parse_ticker(row):
+    """
+    (symbol, quote volume, 24h change %) from a REST 24hr ticker or a miniTicker
+    stream entry, or None.
+    """
+    try:
+        if "quoteVolume" in row:
+            return row["symbol"], float(row["quoteVolume"] or 0), float(row.get("priceChangePercent") or 0)
+        o, c = float(row["o"]), float(row["c"])
+        return row["s"], float(row["q"] or 0), ((c - o) / o * 100) if o else 0.0
+    except (KeyError, TypeError, ValueError):
+        return None
+
+class MarketData:
+    """
+    Market metadata: the tradable symbol index from exchangeInfo (loaded once,
+    reloaded every `info_ttl` seconds) and 24h volume / change rankings for the quote
+    asset. Rankings are updated row by row from ticker data: the all-market
+    miniTicker stream when websocket-client is available, else REST polling.
+
+    fetch_json(url, params=None, weight=1) is the REST getter (ExchangeClient.get_json).
+    """
+    def __init__(self, fetch_json, quote="USDT", ws_url="wss://stream.binance.com:9443",
+                 info_ttl=6 * 3600, poll=60, info_url=EXCHANGE_INFO_URL, ticker_url=TICKER_24HR_URL):
+        self.fetch_json = fetch_json
+        self.info_url = info_url
+        self.ticker_url = ticker_url
+        self.quote = quote
+        self.ws_url = ws_url.rstrip("/")
+        self.info_ttl = info_ttl
+        self.poll = poll
+        self.symbols = {}          # symbol -> {"base": ..., "quote": ...}; empty until loaded
+        self.info_loaded = 0
+        self.info_tried = 0
+        self.volume = Ranking()
+        self.change = Ranking()
+        self.tickers_at = 0        # last time ticker data was applied
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {"info_loads": 0, "ticker_rows": 0, "rest_snapshots": 0, "stream_messages": 0,
+                      "rejected": 0}
+
+    # ----- symbol index -----
+    def load_symbols(self):
+        """(Re)load tradable symbols from exchangeInfo. Returns True on success."""
+        self.info_tried = time.time()
+        try:
+            info = self.fetch_json(self.info_url, weight=EXCHANGE_INFO_WEIGHT)
+            symbols = {s["symbol"]: {"base": s.get("baseAsset"), "quote": s.get("quoteAsset")}
+                       for s in info.get("symbols", [])
+                       if s.get("status") == "TRADING" and s.get("quoteAsset") == self.quote}
+        except Exception as e:
+            print("exchangeInfo error:", e)
+            return False
+        if not symbols:
+            return False
+        with self.lock:
+            self.symbols = symbols
+            self.info_loaded = time.time()
+            # delisted symbols leave the rankings
+            for sym in [s for s in self.volume.values if s not in symbols]:
+                self.volume.remove(sym)
+                self.change.remove(sym)
+        self.stats["info_loads"] += 1
+        return True
+
+    def _ensure_symbols(self):
+        now = time.time()
+        if now - self.info_loaded > self.info_ttl and now - self.info_tried > 60:
+            self.load_symbols()
+
+    def valid(self, symbol):
+        """
+        True if symbol is a tradable pair. While exchangeInfo cannot be loaded nothing
+        is rejected (the bot keeps working as before).
+        """
+        self._ensure_symbols()
+        with self.lock:
+            if not self.symbols:
+                return True
+            ok = symbol in self.symbols
+        if not ok:
+            self.stats["rejected"] += 1
+        return ok
+
+    # ----- rankings -----
+    def apply_tickers(self, rows):
+        """Fold ticker rows (REST 24hr or miniTicker entries) into the rankings."""
+        n = 0
+        with self.lock:
+            for row in rows:
+                parsed = parse_ticker(row)
+                if parsed is None:
+                    continue
+                sym, volume, pct = parsed
+                if self.symbols:
+                    if sym not in self.symbols:
+                        continue
+                elif not sym.endswith(self.quote):
+                    continue
+                self.volume.update(sym, volume)
+                self.change.update(sym, pct)
+                n += 1
+            self.tickers_at = time.time()
+        self.stats["ticker_rows"] += n
+        return n
+
+    def refresh_tickers(self):
+        """One REST snapshot of every 24hr ticker."""
+        data = self.fetch_json(self.ticker_url, weight=TICKER_24HR_WEIGHT)
+        self.stats["rest_snapshots"] += 1
+        return self.apply_tickers(data)
+
+    def fresh(self, max_age=None):
+        max_age = 2 * self.poll if max_age is None else max_age
+        return len(self.volume) > 0 and time.time() - self.tickers_at <= max_age
+
+    def top_volume(self, n):
+        with self.lock:
+            return [s for s, _ in self.volume.top(n)]
+
+    def change_pct(self):
+        """{symbol: 24h change %} for every ranked symbol."""
+        with self.lock:
+            return dict(self.change.values)
+
+    # ----- background updates -----
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
+
+    def _loop(self):
+        try:
+            import websocket  # websocket-client
+        except ImportError:
+            websocket = None
+        backoff = 1
+        while True:
+            try:
+                self._ensure_symbols()
+                if websocket is None:
+                    self.refresh_tickers()
+                    time.sleep(self.poll)
+                    continue
+                # the stream only carries symbols that changed: start from a full snapshot
+                self.refresh_tickers()
+                ws = websocket.create_connection(self.ws_url + MINI_TICKER_STREAM, timeout=30)
+                backoff = 1
+                try:
+                    while True:
+                        self.apply_tickers(json.loads(ws.recv()))
+                        self.stats["stream_messages"] += 1
+                        if time.time() - self.info_loaded > self.info_ttl:
+                            break  # reload exchangeInfo, then reconnect
+                finally:
+                    ws.close()
+            except Exception as e:
+                print("Market data error:", e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
@@ -0,0 +1,159 @@
+import bisect
+import collections
+import sys
+import threading
+import time
+from functools import wraps
+
+# seconds; covers in-process indicator math up to slow HTTP calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+class Metrics:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+    Counters and histograms are recorded inline; gauges are read from callbacks at
+    scrape time so hot paths don't pay for them.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(float)   # (name, labels) -> value
+        self.hists = {}                                  # (name, labels) -> [counts, sum, n]
+        self.help = {}
+        self.gauges = []                                 # (name, help, fn -> {labels: value})
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            h = self.hists.get(key)
+            if h is None:
+                h = self.hists[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def gauge(self, name, help_text, fn):
+        """fn() returns a number or {labels tuple: number}; evaluated on render()."""
+        self.gauges.append((name, help_text, fn))
+
+    def timed(self, name, **labels):
+        """Decorator: observe call latency in `name`, count exceptions in `name`_errors_total."""
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                t = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                except Exception:
+                    self.inc(name + "_errors_total", **labels)
+                    raise
+                finally:
+                    self.observe(name, time.perf_counter() - t, **labels)
+            return wrapper
+        return deco
+
+    def render(self):
+        out = []
+        with self.lock:
+            counters = dict(self.counters)
+            hists = {k: (list(v[0]), v[1], v[2]) for k, v in self.hists.items()}
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in seen:
+                seen.add(name)
+                if name in self.help:
+                    out.append(f"# HELP {name} {self.help[name]}")
+                out.append(f"# TYPE {name} counter")
+            out.append(f"{name}{_label_str(labels)} {value:g}")
+        for (name, labels), (counts, total, n) in sorted(hists.items()):
+            if name not in seen:
+                seen.add(name)
+                if name in self.help:
+                    out.append(f"# HELP {name} {self.help[name]}")
+                out.append(f"# TYPE {name} histogram")
+            cum = 0
+            for b, c in zip(self.buckets, counts):
+                cum += c
+                out.append(f"{name}_bucket{_label_str(labels + (('le', b),))} {cum}")
+            out.append(f"{name}_bucket{_label_str(labels + (('le', '+Inf'),))} {n}")
+            out.append(f"{name}_sum{_label_str(labels)} {total:.6f}")
+            out.append(f"{name}_count{_label_str(labels)} {n}")
+        for name, help_text, fn in self.gauges:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    out.append(f"{name}{_label_str(labels)} {v:g}")
+            else:
+                out.append(f"{name} {value:g}")
+        return "\n".join(out) + "\n"
+
+def ratio(hits, misses):
+    total = hits + misses
+    return hits / total if total else 0.0
+
+class SamplingProfiler:
+    """
+    Opt-in wall-clock sampler: a daemon thread records every other thread's stack
+    each `interval` seconds. report() returns collapsed stacks ("a;b;c count"),
+    ready for flamegraph tools.
+    """
+    def __init__(self, interval=0.01, max_depth=40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = collections.Counter()
+        self.running = False
+        self.thread = None
+        self.started = None
+
+    def start(self):
+        if self.running:
+            return False
+        self.samples.clear()
+        self.running = True
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def _loop(self):
+        me = threading.get_ident()
+        while self.running:
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def report(self, top=None):
+        items = self.samples.most_common(top)
+        return "\n".join(f"{stack} {n}" for stack, n in items) + "\n"
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import numpy as np
+
+WINDOWS = ("5m", "1h", "24h")
+
+class MoversEngine:
+    """
+    Keeps Top Movers rankings for every window fresh in the background.
+
+    universe(window) returns the symbols to rank for a window, or None to let
+    fetch_pct(None, window) return the whole market. cached_pct(symbol, window) returns
+    a percent change computed from local candles, or None; the symbols it cannot answer
+    are fetched with one fetch_pct(symbols, window) -> {symbol: pct} call.
+    All windows are then ranked together in one argsort.
+    """
+    def __init__(self, universe, fetch_pct, cached_pct=None, refresh=60):
+        self.universe = universe
+        self.fetch_pct = fetch_pct
+        self.cached_pct = cached_pct
+        self.refresh_every = refresh
+        self.rankings = {}   # window -> [(symbol, pct)] best first
+        self.updated = 0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.thread = None
+        self.stats = {"refreshes": 0, "from_cache": 0, "fetched": 0}
+
+    def _collect(self, window):
+        symbols = self.universe(window)
+        if symbols is None:
+            # whole market for this window, straight from fetch_pct
+            pct = self.fetch_pct(None, window) or {}
+            self.stats["fetched"] += len(pct)
+            return pct
+        pct = {}
+        missing = []
+        for sym in symbols:
+            v = self.cached_pct(sym, window) if self.cached_pct else None
+            if v is None:
+                missing.append(sym)
+            else:
+                pct[sym] = v
+        self.stats["from_cache"] += len(pct)
+        if missing:
+            fetched = self.fetch_pct(missing, window) or {}
+            self.stats["fetched"] += len(fetched)
+            pct.update(fetched)
+        return pct
+
+    def refresh(self):
+        with self.refresh_lock:
+            per_window = {w: self._collect(w) for w in WINDOWS}
+            symbols = sorted(set().union(*per_window.values()))
+            if not symbols:
+                return
+            col = {s: i for i, s in enumerate(symbols)}
+            mat = np.full((len(WINDOWS), len(symbols)), np.nan)
+            for r, w in enumerate(WINDOWS):
+                for s, v in per_window[w].items():
+                    mat[r, col[s]] = v
+            # descending with NaN (symbol not in that window) last
+            order = np.argsort(np.where(np.isnan(mat), np.inf, -mat), axis=1, kind="stable")
+            rankings = {}
+            for r, w in enumerate(WINDOWS):
+                n = len(per_window[w])
+                rankings[w] = [(symbols[i], float(mat[r, i])) for i in order[r, :n]]
+            with self.lock:
+                self.rankings = rankings
+                self.updated = time.time()
+            self.stats["refreshes"] += 1
+
+    def fresh(self):
+        return time.time() - self.updated <= 2 * self.refresh_every
+
+    def top(self, window, n=10):
+        """Best n (symbol, pct) for a window; refreshes synchronously if nothing is fresh."""
+        if not self.fresh():
+            self.refresh()
+        with self.lock:
+            return self.rankings.get(window, [])[:n]
+
+    def _loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print("Movers refresh error:", e)
+            time.sleep(self.refresh_every)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+
+MAX_MESSAGE_LEN = 4096  # Telegram's limit for one text message
+
+class _Chat:
+    __slots__ = ("queue", "buffer", "buffer_due", "next_at", "busy")
+
+    def __init__(self):
+        self.queue = deque()   # [enqueued_at, text, attempts]
+        self.buffer = []       # (enqueued_at, text) alerts waiting to be merged into a digest
+        self.buffer_due = None
+        self.next_at = 0.0
+        self.busy = False
+
+def digest_messages(items, limit=MAX_MESSAGE_LEN):
+    """Merge [(enqueued_at, text)] into as few messages as fit: [(oldest enqueued_at, text)]."""
+    if len(items) == 1:
+        return [items[0]]
+    out = []
+    chunk, first = [], None
+    header = f"⚡ {len(items)} signals"
+    size = len(header)
+    for ts, text in items:
+        if chunk and size + 2 + len(text) > limit:
+            out.append((first, "\n\n".join(chunk)))
+            chunk, size = [], len(header)
+        if not chunk:
+            first = ts
+            chunk.append(header if not out else header + " (cont.)")
+        chunk.append(text)
+        size += 2 + len(text)
+    out.append((first, "\n\n".join(chunk)))
+    return out
+
+class Outbox:
+    """
+    Asynchronous outbound messages. send() only queues; worker threads deliver while
+    keeping to Telegram's limits: one message per `chat_interval` seconds per chat and
+    `rate` messages per second overall. Digest messages (alerts) are held per chat
+    until flush() or `digest_window` seconds after the first one and go out as one
+    message. A failed send is retried after retry_after(exc) seconds (None: drop it).
+    """
+    def __init__(self, send_fn, retry_after=None, chat_interval=1.0, rate=25.0, digest_window=5.0,
+                 max_attempts=5, workers=4, on_sent=None):
+        self.send_fn = send_fn
+        self.retry_after = retry_after or (lambda exc: None)
+        self.chat_interval = chat_interval
+        self.rate = rate
+        self.tokens = rate
+        self.refilled = time.monotonic()
+        self.digest_window = digest_window
+        self.max_attempts = max_attempts
+        self.workers = workers
+        self.on_sent = on_sent
+        self.chats = {}
+        self.cond = threading.Condition()
+        self.started = False
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "dropped": 0, "digests": 0}
+
+    def start(self):
+        with self.cond:
+            if self.started:
+                return
+            self.started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"outbox-{i}", daemon=True).start()
+
+    def send(self, chat_id, text, digest=False):
+        self.start()
+        now = time.time()
+        with self.cond:
+            c = self.chats.get(chat_id)
+            if c is None:
+                c = self.chats[chat_id] = _Chat()
+            if digest:
+                c.buffer.append((now, text))
+                if c.buffer_due is None:
+                    c.buffer_due = now + self.digest_window
+            else:
+                c.queue.append([now, text, 0])
+            self.stats["queued"] += 1
+            self.cond.notify()
+
+    def flush(self):
+        """Release every held digest now (end of a sweep)."""
+        now = time.time()
+        with self.cond:
+            for c in self.chats.values():
+                if c.buffer:
+                    c.buffer_due = now
+            self.cond.notify_all()
+
+    def depth(self):
+        with self.cond:
+            return sum(len(c.queue) + len(c.buffer) for c in self.chats.values())
+
+    def _pick_locked(self, now):
+        """(chat_id, message) that may go out now, else (None, seconds to wait)."""
+        wake = None
+        best = None
+        for chat_id, c in self.chats.items():
+            if c.buffer and c.buffer_due <= now:
+                for ts, text in digest_messages(c.buffer):
+                    c.queue.append([ts, text, 0])
+                self.stats["digests"] += 1 if len(c.buffer) > 1 else 0
+                c.buffer, c.buffer_due = [], None
+            elif c.buffer:
+                wake = c.buffer_due - now if wake is None else min(wake, c.buffer_due - now)
+            if not c.queue or c.busy:
+                continue
+            if c.next_at > now:
+                wake = c.next_at - now if wake is None else min(wake, c.next_at - now)
+                continue
+            if best is None or c.queue[0][0] < self.chats[best].queue[0][0]:
+                best = chat_id
+        if best is None:
+            return None, wake
+        mono = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (mono - self.refilled) * self.rate)
+        self.refilled = mono
+        if self.tokens < 1:
+            return None, (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        c = self.chats[best]
+        c.busy = True
+        c.next_at = now + self.chat_interval
+        return best, c.queue.popleft()
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while True:
+                    chat_id, item = self._pick_locked(time.time())
+                    if chat_id is not None:
+                        break
+                    self.cond.wait(item)
+            enqueued_at, text, attempts = item
+            try:
+                self.send_fn(chat_id, text)
+                error = None
+            except Exception as e:
+                error = e
+            delay = None if error is None else self.retry_after(error)
+            if error is None and self.on_sent:
+                self.on_sent(time.time() - enqueued_at)
+            elif error is not None and (delay is None or attempts + 1 >= self.max_attempts):
+                print("Outbox send error:", chat_id, error)
+            with self.cond:
+                c = self.chats[chat_id]
+                c.busy = False
+                if error is None:
+                    self.stats["sent"] += 1
+                elif delay is None or attempts + 1 >= self.max_attempts:
+                    self.stats["dropped"] += 1
+                else:
+                    # keep the chat's order: the failed message goes out first once allowed
+                    self.stats["retried"] += 1
+                    c.queue.appendleft([enqueued_at, text, attempts + 1])
+                    c.next_at = max(c.next_at, time.time() + delay)
+                self.cond.notify_all()
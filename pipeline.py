@@ -0,0 +1,275 @@
+"""
+Pluggable indicator pipeline.
+
+Indicators are nodes over a candle window's OHLCV arrays. A node names its inputs
+by asking the graph for them (g("ema", 12), g("close")), so intermediates such as
+EMAs, deltas and the true range are computed once per window however many
+indicators use them. Every node returns an array aligned with the candles (NaN
+while warming up).
+
+Scoring is a list of weighted rules instead of code:
+
+    {"a": "rsi:14", "op": "<", "b": "$rsi_buy", "add": 10, "weight": 1}
+    {"a": "close", "op": ">", "b": "ema:50", "weight": 1, "else": -1}
+    {"a": "close", "op": "<", "b": "bb_lower:20:2", "weight": 1}
+
+`a`/`b` are node keys ("name:param:param"), numbers, or "$setting" (a chat's
+settings, e.g. rsi_buy). A rule adds `weight` when true, `else` (default 0) when
+false, and nothing when an input is missing. DEFAULT_RULES reproduce
+indicators.indicator_score.
+"""
+import json
+import operator
+
+import numpy as np
+
+from indicators import ema_alpha
+
+INPUTS = ("open", "high", "low", "close", "volume")
+NODES = {}
+
+def node(name):
+    """Register fn(g, *params) -> array as indicator `name`."""
+    def deco(fn):
+        NODES[name] = fn
+        return fn
+    return deco
+
+def parse_key(key):
+    """'macd_signal:12:26:9' -> ('macd_signal', (12, 26, 9))"""
+    name, *params = key.split(":")
+    return name, tuple(float(p) if "." in p else int(p) for p in params)
+
+class Graph:
+    """Memoized evaluation of nodes over one window: {column: array} for INPUTS."""
+    def __init__(self, cols):
+        self.cols = {k: np.asarray(v, dtype=np.float64) for k, v in cols.items()}
+        self.memo = {}
+
+    def __call__(self, name, *params):
+        if name in self.cols and not params:
+            return self.cols[name]
+        key = (name,) + params
+        out = self.memo.get(key)
+        if out is None:
+            if name not in NODES:
+                raise KeyError(f"unknown indicator {name!r}")
+            out = self.memo[key] = NODES[name](self, *params)
+        return out
+
+    def key(self, key):
+        name, params = parse_key(key)
+        return self(name, *params)
+
+    def last(self, key):
+        arr = self.key(key)
+        return float(arr[-1]) if len(arr) else float("nan")
+
+# ----- building blocks -----
+def ema_of(x, period):
+    """ewm(span=period, adjust=False) starting at the first value, like IndicatorState."""
+    a = ema_alpha(period)
+    out = np.empty(len(x))
+    acc = None
+    for i, v in enumerate(x.tolist()):
+        acc = v if acc is None else acc + a * (v - acc)
+        out[i] = acc
+    return out
+
+def wilder_of(x, period):
+    """Wilder average seeded with the SMA of the first `period` values; NaN before that."""
+    out = np.full(len(x), np.nan)
+    if len(x) < period:
+        return out
+    acc = float(np.mean(x[:period]))
+    out[period - 1] = acc
+    for i, v in enumerate(x[period:].tolist(), start=period):
+        acc = (acc * (period - 1) + v) / period
+        out[i] = acc
+    return out
+
+def rolling(x, period, fn):
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(x, period)
+        out[period - 1:] = fn(windows, axis=1)
+    return out
+
+# ----- nodes -----
+@node("delta")
+def _delta(g):
+    return np.concatenate(([np.nan], np.diff(g("close"))))
+
+@node("ema")
+def _ema(g, period):
+    return ema_of(g("close"), period)
+
+@node("sma")
+def _sma(g, period):
+    return rolling(g("close"), period, np.mean)
+
+@node("std")
+def _std(g, period):
+    return rolling(g("close"), period, np.std)
+
+@node("rsi")
+def _rsi(g, period):
+    d = g("delta")[1:]
+    gain = wilder_of(np.where(d > 0, d, 0.0), period)
+    loss = wilder_of(np.where(d < 0, -d, 0.0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = 100 - 100 / (1 + gain / loss)
+    r = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), r)
+    r[np.isnan(gain)] = np.nan
+    return np.concatenate(([np.nan], r))
+
+@node("macd")
+def _macd(g, fast, slow):
+    return g("ema", fast) - g("ema", slow)
+
+@node("macd_signal")
+def _macd_signal(g, fast, slow, signal):
+    return ema_of(g("macd", fast, slow), signal)
+
+@node("macd_hist")
+def _macd_hist(g, fast, slow, signal):
+    return g("macd", fast, slow) - g("macd_signal", fast, slow, signal)
+
+@node("bb_upper")
+def _bb_upper(g, period, k):
+    return g("sma", period) + k * g("std", period)
+
+@node("bb_lower")
+def _bb_lower(g, period, k):
+    return g("sma", period) - k * g("std", period)
+
+@node("bb_pct")
+def _bb_pct(g, period, k):
+    lo, hi = g("bb_lower", period, k), g("bb_upper", period, k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (g("close") - lo) / (hi - lo)
+
+@node("true_range")
+def _true_range(g):
+    high, low, close = g("high"), g("low"), g("close")
+    prev = np.concatenate(([np.nan], close[:-1]))
+    return np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+
+@node("atr")
+def _atr(g, period):
+    tr = g("true_range")
+    return np.concatenate(([np.nan], wilder_of(tr[1:], period)))
+
+@node("atr_pct")
+def _atr_pct(g, period):
+    return g("atr", period) / g("close") * 100
+
+@node("vwap")
+def _vwap(g, period):
+    typical = (g("high") + g("low") + g("close")) / 3
+    pv = rolling(typical * g("volume"), period, np.sum)
+    v = rolling(g("volume"), period, np.sum)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pv / v
+
+@node("volume_ratio")
+def _volume_ratio(g, period):
+    # current volume vs the average of the `period` candles before it
+    vol = g("volume")
+    prev = np.concatenate(([np.nan], rolling(vol, period, np.mean)[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return vol / prev
+
+# ----- scoring -----
+OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+DEFAULT_RULES = [
+    {"a": "rsi:14", "op": "<", "b": "$rsi_buy", "add": 10, "weight": 1},
+    {"a": "rsi:14", "op": "<", "b": "$rsi_buy", "weight": 1},
+    {"a": "rsi:14", "op": ">", "b": "$rsi_sell", "add": -10, "weight": -1},
+    {"a": "rsi:14", "op": ">", "b": "$rsi_sell", "weight": -1},
+    {"a": "macd:12:26", "op": ">", "b": "macd_signal:12:26:9", "weight": 1, "else": -1},
+    {"a": "close", "op": ">", "b": "ema:50", "weight": 1, "else": -1},
+]
+
+# node keys whose current value the incremental IndicatorState already provides
+STATE_KEYS = {"rsi:14": "rsi", "ema:50": "ema50", "macd:12:26": "macd",
+              "macd_signal:12:26:9": "macd_signal", "close": "price"}
+
+def _is_node(term):
+    return isinstance(term, str) and not term.startswith("$")
+
+def _missing(v):
+    return v is None or v != v
+
+class Scorer:
+    """Configured rules -> integer score, from scalar values or whole arrays."""
+    def __init__(self, rules=None):
+        self.rules = [dict(r) for r in (rules or DEFAULT_RULES)]
+        for r in self.rules:
+            if r.get("op") not in OPS or "a" not in r or "b" not in r:
+                raise ValueError(f"bad scoring rule {r}")
+        self.compiled = [(r["a"], OPS[r["op"]], r["b"], r.get("add", 0), r.get("weight", 1), r.get("else", 0))
+                         for r in self.rules]
+        self.keys = sorted({t for r in self.rules for t in (r["a"], r["b"]) if _is_node(t)})
+        # what live scoring has to compute beyond IndicatorState
+        self.extra_keys = [k for k in self.keys if k not in STATE_KEYS]
+        self.is_default = self.rules == DEFAULT_RULES
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def extra_values(self, cols):
+        """{key: last value or None} for the keys IndicatorState doesn't provide, from one Graph."""
+        g = Graph(cols)
+        out = {}
+        for k in self.extra_keys:
+            try:
+                v = g.last(k)
+            except KeyError:
+                v = None   # needs a column the caller doesn't have
+            out[k] = None if _missing(v) else v
+        return out
+
+    def values(self, state_vals, extra=None):
+        """{key: value} for the rules: IndicatorState-style values plus extra_values()."""
+        out = {k: state_vals.get(v) for k, v in STATE_KEYS.items() if k in self.keys}
+        if extra:
+            out.update(extra)
+        return out
+
+    def history(self, cols):
+        """{key: array} over a whole window (backtests)."""
+        g = Graph(cols)
+        return {k: g.key(k) for k in self.keys}
+
+    @staticmethod
+    def _term(term, values, prefs):
+        if isinstance(term, (int, float)):
+            return term
+        if term.startswith("$"):
+            return prefs.get(term[1:])
+        return values.get(term)
+
+    def score(self, values, prefs):
+        """Sum of rule weights for scalar values (a rule with a missing input adds nothing)."""
+        total = 0
+        for a, op, b, add, weight, other in self.compiled:
+            a = self._term(a, values, prefs)
+            b = self._term(b, values, prefs)
+            if _missing(a) or _missing(b):
+                continue
+            total += weight if op(a, b + add) else other
+        return total
+
+    def score_arrays(self, values, prefs):
+        """score() over aligned arrays (NaN = missing) -> int32 array."""
+        total = None
+        for a, op, b, add, weight, other in self.compiled:
+            a = np.asarray(self._term(a, values, prefs), dtype=np.float64)
+            b = np.asarray(self._term(b, values, prefs), dtype=np.float64) + add
+            part = np.where(np.isnan(a) | np.isnan(b), 0, np.where(op(a, b), weight, other))
+            total = part if total is None else total + part
+        return np.asarray(0 if total is None else total, dtype=np.int32)
@@ -0,0 +1,158 @@
+import heapq
+import threading
+import time
+import zlib
+
+from kline_store import INTERVAL_MS
+
+class ScanScheduler:
+    """
+    Decides when each (symbol, interval) pair is evaluated: once per candle close
+    instead of on a fixed cadence. Entries sit in a heap keyed by due time.
+
+    - each pair gets a stable offset in [0, spread) after its close, so pairs that
+      close together are spread out instead of all firing on the same second
+    - done(..., price=p) remembers the price the pair was scored at; when another
+      interval of the same symbol later reports a move of at least `move_pct`,
+      the pair is evaluated right away instead of waiting for its close
+    - a failed evaluation is retried with exponential backoff (retry_base doubling
+      up to max_backoff), reset by the next success
+    """
+    def __init__(self, settle=1.0, max_spread=20.0, move_pct=0.01,
+                 retry_base=10.0, max_backoff=900.0, long_recheck=3600.0):
+        self.settle = settle
+        self.max_spread = max_spread
+        self.move_pct = move_pct
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self.long_recheck = long_recheck
+        self.heap = []          # (due, seq, symbol, interval)
+        self.entries = {}       # (symbol, interval) -> seq of its live heap entry
+        self.inflight = set()
+        self.intervals = {}     # symbol -> {interval}
+        self.ref_price = {}     # (symbol, interval) -> price at last evaluation
+        self.failures = {}      # (symbol, interval) -> consecutive failures
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.stats = {"due": 0, "moved": 0, "failed": 0}
+
+    def _offset(self, symbol, interval, step_s):
+        spread = min(self.max_spread, step_s * 0.1)
+        return (zlib.crc32(f"{symbol}_{interval}".encode()) % 1000) / 1000.0 * spread
+
+    def next_close(self, symbol, interval, now=None):
+        """Wall-clock time this pair should next be evaluated on its own schedule."""
+        now = time.time() if now is None else now
+        step = INTERVAL_MS.get(interval)
+        if not step or step > INTERVAL_MS["1d"]:
+            # weekly/monthly candles don't close on epoch multiples; just recheck
+            return now + self.long_recheck
+        step_s = step / 1000.0
+        close = (now // step_s + 1) * step_s
+        return close + self.settle + self._offset(symbol, interval, step_s)
+
+    def _push_locked(self, key, due):
+        self.seq += 1
+        self.entries[key] = self.seq
+        heapq.heappush(self.heap, (due, self.seq, key[0], key[1]))
+
+    def set_pairs(self, pairs, now=None):
+        """
+        Replace the tracked pair set. New pairs are due immediately (first score);
+        dropped pairs are forgotten (their heap entries are skipped lazily).
+        """
+        now = time.time() if now is None else now
+        wanted = set(pairs)
+        with self.lock:
+            for key in list(self.entries):
+                if key not in wanted:
+                    self._forget_locked(key)
+            for key in wanted:
+                if key not in self.entries and key not in self.inflight:
+                    self._push_locked(key, now)
+            self.intervals = {}
+            for symbol, interval in wanted:
+                self.intervals.setdefault(symbol, set()).add(interval)
+
+    def _forget_locked(self, key):
+        self.entries.pop(key, None)
+        self.ref_price.pop(key, None)
+        self.failures.pop(key, None)
+
+    def pop_due(self, now=None):
+        """Take every pair that is due. Returns [(symbol, interval, seconds late)]."""
+        now = time.time() if now is None else now
+        out = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due, seq, symbol, interval = heapq.heappop(self.heap)
+                key = (symbol, interval)
+                if self.entries.get(key) != seq:
+                    continue  # rescheduled or dropped since
+                del self.entries[key]
+                self.inflight.add(key)
+                out.append((symbol, interval, now - due))
+            self.stats["due"] += len(out)
+        return out
+
+    def wait(self, now=None, cap=5.0):
+        """Seconds until the next entry is due (at most `cap`)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            if not self.heap:
+                return cap
+            return max(0.0, min(cap, self.heap[0][0] - now))
+
+    def done(self, symbol, interval, ok, price=None, now=None):
+        """Reschedule a popped pair after its evaluation."""
+        now = time.time() if now is None else now
+        key = (symbol, interval)
+        with self.lock:
+            self.inflight.discard(key)
+            if interval not in self.intervals.get(symbol, ()):
+                self._forget_locked(key)
+                return
+            if ok:
+                self.failures.pop(key, None)
+                due = self.next_close(symbol, interval, now)
+                if price:
+                    self.ref_price[key] = price
+                    self._check_moves_locked(symbol, interval, price, now)
+            else:
+                n = self.failures[key] = self.failures.get(key, 0) + 1
+                self.stats["failed"] += 1
+                due = now + min(self.max_backoff, self.retry_base * 2 ** (n - 1))
+            self._push_locked(key, due)
+
+    def _check_moves_locked(self, symbol, interval, price, now):
+        # a fresh price from one interval can pull the symbol's other intervals forward
+        for other in self.intervals.get(symbol, ()):
+            key = (symbol, other)
+            ref = self.ref_price.get(key)
+            if other == interval or not ref or key not in self.entries or key in self.failures:
+                continue
+            if abs(price / ref - 1) >= self.move_pct:
+                self.ref_price[key] = price  # one early evaluation per move
+                self.stats["moved"] += 1
+                self._push_locked(key, now)
+
+    def cycle_done(self, now=None):
+        """
+        True once the current candle-close wave has been handed out and evaluated:
+        nothing in flight and nothing due before the wave's last offset. Every
+        interval closes on a minute boundary, so a wave is the pairs due within
+        settle + max_spread of the latest minute close.
+        """
+        now = time.time() if now is None else now
+        wave_end = now // 60 * 60 + self.settle + self.max_spread
+        with self.lock:
+            if self.inflight:
+                return False
+            heap = self.heap
+            while heap and self.entries.get((heap[0][2], heap[0][3])) != heap[0][1]:
+                heapq.heappop(heap)  # stale entry
+            return not heap or heap[0][0] > wave_end
+
+    def pending(self):
+        with self.lock:
+            return len(self.entries)
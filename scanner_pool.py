@@ -0,0 +1,186 @@
+import fcntl
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+KLINES_URL = "https://api.binance.com/api/v3/klines"
+KLINES_WEIGHT = 2
+
+class LeaderLock:
+    """
+    Non-blocking exclusive flock on a file: the process that holds it is the one
+    scanner for the deployment (gunicorn workers, a separate scanner service).
+    The lock goes away with the process, so a standby takes over on its next try.
+    Ownership is exclusive within a process too: acquire() on a held lock returns
+    False, so a second scanner loop in the same process can't also become leader.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        if self.fd is not None:
+            return False
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self.fd = fd
+        return True
+
+    def held(self):
+        return self.fd is not None
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+def shard_of(symbol, shards):
+    # stable across processes (unlike hash()), so a symbol's candles and indicator
+    # state always live in the same worker
+    return zlib.crc32(symbol.encode()) % shards
+
+def _shard_main(shard, tasks, results, config):
+    """
+    Worker process: owns a KlineStore and the IndicatorStates for its symbols.
+    Receives (batch, [(symbol, interval)]) and answers (batch, symbol, interval, vals).
+    """
+    from exchange_client import ExchangeClient
+    from indicators import IndicatorState
+    from kline_archive import KlineArchive
+    from kline_store import DERIVED_FROM, KlineStore
+    from pipeline import Scorer
+
+    exchange = ExchangeClient(limit_per_min=config["weight_limit"])
+
+    def fetch_raw(symbol, interval, limit):
+        try:
+            params = {"symbol": symbol, "interval": interval, "limit": limit}
+            data = exchange.get_json(config["klines_url"], params=params, weight=KLINES_WEIGHT)
+            if isinstance(data, dict) and data.get("code"):
+                return None
+            return data
+        except Exception:
+            return None
+
+    archive = KlineArchive(config["archive_dir"]) if config.get("archive_dir") else None
+    store = KlineStore(fetch_raw, capacity=config["capacity"], max_series=config["max_series"], archive=archive,
+                       derive=DERIVED_FROM if config.get("resample", True) else None)
+    states = {}
+    scorer = Scorer(config.get("rules"))
+    fields = ("open_time", "open", "high", "low", "close", "volume") if scorer.extra_keys else ("open_time", "close")
+    pool = ThreadPoolExecutor(max_workers=max(1, config["threads"]))
+
+    def evaluate(symbol, interval):
+        snap = store.snapshot(symbol, interval, 200, fields)
+        if snap is None or len(snap["close"]) < 30:
+            return None
+        st = states.get((symbol, interval))
+        if st is None:
+            st = states[(symbol, interval)] = IndicatorState()
+        vals = st.sync(snap["open_time"], snap["close"])
+        if vals:
+            vals["open_time"] = int(snap["open_time"][-1])
+            if scorer.extra_keys:
+                vals["extra"] = scorer.extra_values(snap)
+        return vals
+
+    def run(batch, symbol, interval):
+        try:
+            vals = evaluate(symbol, interval)
+        except Exception as e:
+            print("Shard", shard, "scan error:", symbol, interval, e)
+            vals = None
+        results.put((batch, symbol, interval, vals))
+
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        batch, pairs = item
+        for symbol, interval in pairs:
+            pool.submit(run, batch, symbol, interval)
+    pool.shutdown(wait=True)
+
+class ShardedScanner:
+    """
+    Spreads kline fetching and indicator updates over `processes` worker processes,
+    each owning the symbols that hash to it (so per-series state is never shared).
+    The Binance weight budget is split evenly between the workers. scan() yields
+    (symbol, interval, vals) in completion order; scoring and alerting stay with the caller.
+    `rules` are the scoring rules, so workers also compute the extra indicators they use.
+    """
+    def __init__(self, processes, weight_limit=6000, threads=8, capacity=300, max_series=1500,
+                 archive_dir=None, klines_url=KLINES_URL, timeout=60, rules=None, resample=True):
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.config = {"weight_limit": max(1, weight_limit // self.processes), "threads": threads,
+                       "capacity": capacity, "max_series": max(1, max_series // self.processes),
+                       "archive_dir": archive_dir, "klines_url": klines_url, "rules": rules,
+                       "resample": resample}
+        # spawn: workers start clean instead of inheriting the web process's threads
+        self.ctx = multiprocessing.get_context("spawn")
+        self.results = self.ctx.Queue()
+        self.tasks = [None] * self.processes
+        self.procs = [None] * self.processes
+        self.batch = 0
+        self.stats = {"batches": 0, "timeouts": 0, "restarts": 0}
+
+    def _ensure(self, shard):
+        proc = self.procs[shard]
+        if proc is not None and proc.is_alive():
+            return
+        if proc is not None:
+            self.stats["restarts"] += 1
+        self.tasks[shard] = self.ctx.Queue()
+        proc = self.ctx.Process(target=_shard_main, name=f"scanner-shard-{shard}",
+                                args=(shard, self.tasks[shard], self.results, self.config), daemon=True)
+        proc.start()
+        self.procs[shard] = proc
+
+    def start(self):
+        for shard in range(self.processes):
+            self._ensure(shard)
+
+    def scan(self, pairs):
+        self.batch += 1
+        self.stats["batches"] += 1
+        batch = self.batch
+        by_shard = {}
+        for symbol, interval in pairs:
+            by_shard.setdefault(shard_of(symbol, self.processes), []).append((symbol, interval))
+        for shard, items in by_shard.items():
+            self._ensure(shard)
+            self.tasks[shard].put((batch, items))
+        waiting = set(pairs)
+        deadline = time.time() + self.timeout
+        while waiting:
+            try:
+                got, symbol, interval, vals = self.results.get(timeout=max(0.1, deadline - time.time()))
+            except queue.Empty:
+                break
+            if got != batch or (symbol, interval) not in waiting:
+                continue  # late answer from a timed-out batch
+            waiting.discard((symbol, interval))
+            yield symbol, interval, vals
+        if waiting:
+            self.stats["timeouts"] += len(waiting)
+            for symbol, interval in waiting:
+                yield symbol, interval, None
+
+    def stop(self):
+        for shard, proc in enumerate(self.procs):
+            if proc is not None and proc.is_alive():
+                self.tasks[shard].put(None)
+        for proc in self.procs:
+            if proc is not None:
+                proc.join(timeout=5)
@@ -0,0 +1,42 @@
+"""
+Standalone scanner for large universes:
+
+    SCANNER_MODE=service gunicorn index:app          # web: UI only
+    python scanner_service.py --processes 4          # scanner (always runs as SCANNER_MODE=service)
+
+Candle fetching and indicator updates are sharded by symbol over a process pool
+(scanner_pool.ShardedScanner), so they are not capped by one interpreter's GIL.
+Scoring, alerts and the schedule run here. Only the holder of DATA_DIR/scanner.lock
+scans, so starting the service twice doesn't double alerts (the second one waits
+as a standby). Results reach the web workers through the shared state database.
+"""
+import argparse
+import os
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the signal scanner as its own process group.")
+    ap.add_argument("--processes", type=int, default=int(os.environ.get("SCAN_PROCESSES", os.cpu_count() or 2)))
+    ap.add_argument("--threads", type=int, default=8, help="in-flight kline fetches per process")
+    args = ap.parse_args()
+
+    # the web/warmup path of index must not start its own thread-mode scanner in
+    # this process next to the sharded one
+    os.environ["SCANNER_MODE"] = "service"
+    import index
+    from scanner_pool import ShardedScanner
+
+    shards = ShardedScanner(args.processes,
+                            weight_limit=int(os.environ.get("BINANCE_WEIGHT_LIMIT", 6000)),
+                            threads=args.threads,
+                            archive_dir=index.kline_archive.root,
+                            klines_url=index.KLINES_URL,
+                            rules=index.scorer.rules,
+                            resample=index.KLINE_RESAMPLE)
+    shards.start()
+    try:
+        index.run_scanner(lambda pairs: index.scan_sharded(shards, pairs))
+    finally:
+        shards.stop()
+
+if __name__ == "__main__":
+    main()
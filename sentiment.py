@@ -0,0 +1,104 @@
+import threading
+import time
+
+BULL_WORDS = ["bull", "positive", "up", "surge", "rally", "breakout", "buy"]
+BEAR_WORDS = ["bear", "negative", "down", "dump", "sell", "crash", "drop"]
+
+def title_sentiment(title):
+    """+1 / -1 / 0 keyword heuristic on a post title."""
+    title = (title or "").lower()
+    if any(w in title for w in BULL_WORDS):
+        return 1
+    if any(w in title for w in BEAR_WORDS):
+        return -1
+    return 0
+
+def score_posts(posts, limit=10):
+    """Average title sentiment of the first `limit` posts -> (score -1..+1, count)."""
+    posts = posts[:limit]
+    if not posts:
+        return 0.0, 0
+    return sum(title_sentiment(p.get("title")) for p in posts) / len(posts), len(posts)
+
+class SentimentCache:
+    """
+    Per-currency sentiment scores, refreshed off the signal path.
+
+    get() never touches the network: it returns the cached (score, count), or
+    (0.0, 0) until the first refresh, and records the currency as wanted. A daemon
+    thread refreshes wanted currencies older than `ttl` seconds, `batch` currencies
+    per fetch_batch(currencies) call, which must return {currency: (score, count)}
+    or None (or raise) on failure. A failed fetch keeps the last good scores and is
+    retried after `retry` seconds.
+    """
+    def __init__(self, fetch_batch, ttl=600, batch=5, poll=5, retry=60):
+        self.fetch_batch = fetch_batch
+        self.ttl = ttl
+        self.batch = batch
+        self.poll = poll
+        self.retry = retry
+        self.scores = {}   # currency -> (score, count, fetched_at)
+        self.wanted = {}   # currency -> last time get() asked for it
+        self.failed = {}   # currency -> last failed fetch
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0}
+
+    def get(self, currency):
+        now = time.time()
+        with self.lock:
+            self.wanted[currency] = now
+            entry = self.scores.get(currency)
+            if entry is None:
+                self.stats["misses"] += 1
+                return 0.0, 0
+            self.stats["hits"] += 1
+            return entry[0], entry[1]
+
+    def stale(self):
+        """Wanted currencies that are missing or older than ttl, oldest first."""
+        now = time.time()
+        with self.lock:
+            # forget currencies nobody asked about for a while
+            for cur in [c for c, t in self.wanted.items() if now - t > 4 * self.ttl]:
+                del self.wanted[cur]
+                self.failed.pop(cur, None)
+            due = [c for c in self.wanted
+                   if (c not in self.scores or now - self.scores[c][2] > self.ttl)
+                   and now - self.failed.get(c, 0) > self.retry]
+            return sorted(due, key=lambda c: self.scores.get(c, (0, 0, 0))[2])
+
+    def refresh(self, currencies):
+        for i in range(0, len(currencies), self.batch):
+            chunk = currencies[i:i + self.batch]
+            self.stats["fetches"] += 1
+            try:
+                result = self.fetch_batch(chunk)
+            except Exception as e:
+                print("Sentiment refresh error:", e)
+                result = None
+            now = time.time()
+            with self.lock:
+                for cur in chunk:
+                    if result is None or cur not in result:
+                        # keep the last good score (and its age) and try again later
+                        self.failed[cur] = now
+                        continue
+                    score, count = result[cur]
+                    self.scores[cur] = (score, count, now)
+                    self.failed.pop(cur, None)
+
+    def _loop(self):
+        while True:
+            try:
+                due = self.stale()
+                if due:
+                    self.refresh(due)
+            except Exception as e:
+                print("Sentiment loop error:", e)
+            time.sleep(self.poll)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+class SignalCache:
+    """
+    Latest computed signal per (symbol, interval), tagged with the open time of the
+    candle it was computed on. The scanner writes, UI handlers read.
+
+    get_or_compute() serves a fresh entry (younger than max_age seconds) or runs
+    compute() -> (open_time, signal) once per key while concurrent callers wait for it.
+    """
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self.entries = {}   # (symbol, interval) -> (open_time, signal, computed_at)
+        self.pending = {}   # (symbol, interval) -> threading.Event
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "waits": 0}
+
+    def put(self, symbol, interval, open_time, signal):
+        key = (symbol, interval)
+        with self.lock:
+            old = self.entries.get(key)
+            # never let a late write for an older candle replace a newer one
+            if old and old[0] is not None and open_time is not None and open_time < old[0]:
+                return
+            self.entries[key] = (open_time, signal, time.time())
+
+    def get(self, symbol, interval, max_age=None):
+        """Fresh cached signal or None."""
+        max_age = self.max_age if max_age is None else max_age
+        with self.lock:
+            entry = self.entries.get((symbol, interval))
+        if entry and time.time() - entry[2] <= max_age:
+            return entry[1]
+        return None
+
+    def get_or_compute(self, symbol, interval, compute, max_age=None):
+        key = (symbol, interval)
+        while True:
+            sig = self.get(symbol, interval, max_age)
+            if sig is not None:
+                self.stats["hits"] += 1
+                return sig
+            with self.lock:
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+            if not owner:
+                self.stats["waits"] += 1
+                event.wait(30)
+                with self.lock:
+                    entry = self.entries.get(key)
+                if entry and time.time() - entry[2] <= (self.max_age if max_age is None else max_age):
+                    return entry[1]
+                if self.pending.get(key) is event:
+                    continue  # owner still running after the wait; try again
+                return None   # owner failed or produced nothing
+            self.stats["misses"] += 1
+            try:
+                open_time, sig = compute()
+                if sig is not None:
+                    self.put(symbol, interval, open_time, sig)
+                return sig
+            finally:
+                with self.lock:
+                    self.pending.pop(key, None)
+                event.set()
@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+class StateStore:
+    """
+    Bot state in SQLite (WAL mode): one row per (namespace, key) with a JSON value,
+    so a single alert or coin change is one small atomic write instead of a file rewrite.
+    Connections are per thread; WAL lets readers run alongside the writer.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS kv ("
+                      "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                      "PRIMARY KEY (ns, key))")
+
+    def _conn(self):
+        tx = getattr(self.local, "tx", None)
+        if tx is None:
+            raw = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+            tx = self.local.tx = _Tx(raw)
+        return tx
+
+    def get(self, ns, key, default=None):
+        row = self._conn().raw.execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def items(self, ns):
+        """{key: value} for a namespace, in rowid (insertion) order."""
+        rows = self._conn().raw.execute("SELECT key, value FROM kv WHERE ns=? ORDER BY rowid", (ns,))
+        return {k: json.loads(v) for k, v in rows}
+
+    def put(self, ns, key, value):
+        with self._conn() as c:
+            c.execute("INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                      "ON CONFLICT (ns, key) DO UPDATE SET value=excluded.value",
+                      (ns, key, json.dumps(value)))
+
+    def put_many(self, ns, mapping):
+        with self._conn() as c:
+            c.executemany("INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                          "ON CONFLICT (ns, key) DO UPDATE SET value=excluded.value",
+                          [(ns, k, json.dumps(v)) for k, v in mapping.items()])
+
+    def update(self, ns, key, fn, default=None):
+        """
+        Read-modify-write of one row in a single IMMEDIATE transaction, so a write
+        from another process can't land between the read and the write. fn(value)
+        changes the value in place; returns (value, fn's result).
+        """
+        with self._conn() as c:
+            row = c.execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+            value = json.loads(row[0]) if row else default
+            result = fn(value)
+            c.execute("INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                      "ON CONFLICT (ns, key) DO UPDATE SET value=excluded.value",
+                      (ns, key, json.dumps(value)))
+        return value, result
+
+    # ----- change counters -----
+    # processes cache namespaces (subscriptions, alert states); a writer bumps the
+    # namespace's counter (meta row "version:<ns>") and readers reload when it moves
+    def bump(self, ns):
+        with self._conn() as c:
+            c.execute("INSERT INTO kv (ns, key, value) VALUES ('meta', ?, '1') "
+                      "ON CONFLICT (ns, key) DO UPDATE SET value=CAST(value AS INTEGER) + 1",
+                      (f"version:{ns}",))
+
+    def version(self, ns):
+        return self.get("meta", f"version:{ns}", 0)
+
+    def delete(self, ns, key):
+        with self._conn() as c:
+            c.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, key))
+
+    def delete_many(self, ns, keys):
+        with self._conn() as c:
+            c.executemany("DELETE FROM kv WHERE ns=? AND key=?", [(ns, k) for k in keys])
+
+    def clear(self, ns):
+        with self._conn() as c:
+            c.execute("DELETE FROM kv WHERE ns=?", (ns,))
+
+    def is_empty(self, ns):
+        return self._conn().raw.execute("SELECT 1 FROM kv WHERE ns=? LIMIT 1", (ns,)).fetchone() is None
+
+    # ----- JSON import / export -----
+    def import_json(self, ns, path, as_list=False):
+        """
+        Seed an empty namespace from a legacy JSON file, once: a meta row
+        "imported:<ns>" records the migration, so a namespace emptied later (reset,
+        cleared mutes) is not refilled from the old file. Lists become keys
+        (value = position), dicts are copied key by key. Returns True if anything was imported.
+        """
+        marker = f"imported:{ns}"
+        if self.get("meta", marker) is not None:
+            return False
+        if not self.is_empty(ns) or not os.path.exists(path):
+            self.put("meta", marker, time.time())
+            return False
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print("State import error:", path, e)
+            return False
+        if as_list:
+            data = {str(k): i for i, k in enumerate(data)}
+        with self._conn() as c:
+            if isinstance(data, dict) and data:
+                c.executemany("INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                              "ON CONFLICT (ns, key) DO UPDATE SET value=excluded.value",
+                              [(ns, k, json.dumps(v)) for k, v in data.items()])
+            c.execute("INSERT OR REPLACE INTO kv (ns, key, value) VALUES ('meta', ?, ?)",
+                      (marker, json.dumps(time.time())))
+        return isinstance(data, dict) and bool(data)
+
+    def export_json(self, ns, path, as_list=False):
+        data = self.items(ns)
+        if as_list:
+            data = list(data.keys())
+        write_json_atomic(path, data)
+
+class _Tx:
+    """sqlite3 connection wrapper whose `with` block is one IMMEDIATE transaction."""
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __enter__(self):
+        self.raw.execute("BEGIN IMMEDIATE")
+        return self.raw
+
+    def __exit__(self, exc_type, exc, tb):
+        self.raw.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+def write_json_atomic(path, data):
+    """Write to a temp file in the same directory, fsync, then rename over `path`."""
+    d = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
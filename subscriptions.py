@@ -0,0 +1,168 @@
+import copy
+import threading
+
+DEFAULT_INTERVALS = ["1m", "5m", "15m", "1h"]
+
+class Subscriptions:
+    """
+    Per-chat watchlists, mutes, intervals and signal settings, persisted one row per
+    chat (namespace "chats"), plus the inverted index (symbol, interval) -> chats used
+    to fan a pair's signal out. An enrolled chat with an empty watchlist follows the
+    top-coins universe, like the single-chat bot did; other chats only get alerts
+    for coins they added.
+
+    Profile: {"coins": [...], "muted": [...], "intervals": {symbol: [...]},
+              "settings": {...overrides...}, "tracked": symbol or None, "top": bool}
+
+    Web workers and the scanner write the same rows, so updates re-read the row
+    inside the write transaction instead of trusting this process's copy, and bump
+    the namespace's version; sync() reloads when another process changed it.
+    """
+    def __init__(self, store, defaults, ns="chats"):
+        self.store = store
+        self.defaults = defaults      # global settings dict; chat settings override it
+        self.ns = ns
+        self.lock = threading.Lock()
+        self.index = {}               # (symbol, interval) -> {chat_id}
+        self.top_followers = set()
+        self.top_pairs = frozenset()
+        self.version = None
+        self.sync()
+
+    # ----- index -----
+    def _chat_pairs(self, p):
+        syms = list(p.get("coins") or [])
+        if p.get("tracked") and p["tracked"] not in syms:
+            syms.append(p["tracked"])
+        intervals = p.get("intervals") or {}
+        return [(s, i) for s in syms for i in intervals.get(s, DEFAULT_INTERVALS)]
+
+    def _rebuild_locked(self):
+        index = {}
+        top = set()
+        for chat_id, p in self.profiles.items():
+            if p.get("top") and not p.get("coins"):
+                top.add(chat_id)
+            for key in self._chat_pairs(p):
+                index.setdefault(key, set()).add(chat_id)
+        self.index = index
+        self.top_followers = top
+        self.sentiment_users = sum(1 for c in self.profiles if self._prefs_locked(c).get("use_sentiment", True))
+
+    def follows_top(self):
+        return bool(self.top_followers)
+
+    def pairs(self, top=()):
+        """
+        Every (symbol, interval) someone follows, each once. `top` is the current
+        top-coins list for chats without a watchlist.
+        """
+        with self.lock:
+            top_pairs = frozenset((s, i) for s in top for i in DEFAULT_INTERVALS) if self.top_followers else frozenset()
+            self.top_pairs = top_pairs
+            return list(self.index.keys() | top_pairs)
+
+    def chats_for(self, symbol, interval):
+        """Chats that want alerts for the pair (muted ones excluded)."""
+        with self.lock:
+            chats = set(self.index.get((symbol, interval), ()))
+            if (symbol, interval) in self.top_pairs:
+                chats |= self.top_followers
+            return [c for c in chats if symbol not in (self.profiles[c].get("muted") or ())]
+
+    def sync(self):
+        """Reload all profiles if the stored version moved. True if reloaded."""
+        # version first: a write landing after the read below shows up next time
+        version = self.store.version(self.ns)
+        if version == self.version:
+            return False
+        profiles = {int(k): v for k, v in self.store.items(self.ns).items()}
+        with self.lock:
+            self.profiles = profiles
+            self.version = version
+            self._rebuild_locked()
+        return True
+
+    # ----- profiles -----
+    def _prefs_locked(self, chat_id):
+        p = self.profiles.get(chat_id) or {}
+        prefs = dict(self.defaults)
+        prefs.update(p.get("settings") or {})
+        return prefs
+
+    def prefs(self, chat_id):
+        """Effective signal settings for a chat (global settings + its overrides)."""
+        with self.lock:
+            return self._prefs_locked(chat_id)
+
+    def uses_sentiment(self):
+        return self.sentiment_users > 0
+
+    def profile(self, chat_id):
+        with self.lock:
+            return copy.deepcopy(self.profiles.get(chat_id) or {})
+
+    def coins(self, chat_id):
+        with self.lock:
+            return list((self.profiles.get(chat_id) or {}).get("coins") or [])
+
+    def _update(self, chat_id, fn):
+        with self.lock:
+            p, result = self.store.update(self.ns, str(chat_id), fn, {})
+            self.store.bump(self.ns)
+            self.profiles[chat_id] = p
+            self._rebuild_locked()
+            return result
+
+    def enrol(self, chat_id):
+        """Opt a chat into top-coins alerts (while its watchlist is empty)."""
+        with self.lock:
+            if (self.profiles.get(chat_id) or {}).get("top"):
+                return False
+        def enrol(p):
+            if p.get("top"):
+                return False
+            p["top"] = True
+            return True
+        return self._update(chat_id, enrol)
+
+    def add_coin(self, chat_id, symbol):
+        def add(p):
+            coins = p.setdefault("coins", [])
+            if symbol in coins:
+                return False
+            coins.append(symbol)
+            return True
+        return self._update(chat_id, add)
+
+    def mute(self, chat_id, symbol):
+        def mute(p):
+            muted = p.setdefault("muted", [])
+            if symbol not in muted:
+                muted.append(symbol)
+        self._update(chat_id, mute)
+
+    def set_tracked(self, chat_id, symbol):
+        self._update(chat_id, lambda p: p.__setitem__("tracked", symbol))
+
+    def set_settings(self, chat_id, values):
+        self._update(chat_id, lambda p: p.setdefault("settings", {}).update(values))
+
+    def reset(self, chat_id):
+        """Clear watchlist, mutes, intervals and tracking (settings are kept)."""
+        def reset(p):
+            for k in ("coins", "muted", "intervals", "tracked"):
+                p.pop(k, None)
+        self._update(chat_id, reset)
+
+    def seed(self, chat_id, profile):
+        """Create a chat from existing data (migration); no-op if it already exists."""
+        with self.lock:
+            if chat_id in self.profiles:
+                return False
+        def seed(p):
+            if p:
+                return False
+            p.update(copy.deepcopy(profile))
+            return True
+        return self._update(chat_id, seed)
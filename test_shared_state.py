@@ -0,0 +1,69 @@
+"""
+Web workers and the scanner are separate processes sharing state.db: changes made
+in one must reach the other's cached subscriptions and alert states.
+
+    python -m pytest -q test_shared_state.py
+"""
+import multiprocessing as mp
+
+from alerts import AlertEngine
+from state_store import StateStore
+from subscriptions import Subscriptions
+
+def web_worker(path):
+    # what the handlers do: /start, add coin, settings, /reset
+    store = StateStore(path)
+    subs = Subscriptions(store, {"rsi_buy": 25})
+    subs.enrol(7)
+    subs.add_coin(5, "ETHUSDT")
+    subs.set_settings(5, {"rsi_buy": 30})
+    AlertEngine(store).reset_chat(9)
+
+def add_coins(path, prefix, n):
+    subs = Subscriptions(StateStore(path), {})
+    for i in range(n):
+        subs.add_coin(5, f"{prefix}{i}USDT")
+
+def run(target, *args):
+    p = mp.get_context("spawn").Process(target=target, args=args)
+    p.start()
+    p.join(30)
+    assert p.exitcode == 0
+
+def test_scanner_picks_up_web_worker_changes(tmp_path):
+    path = str(tmp_path / "state.db")
+    store = StateStore(path)
+    subs = Subscriptions(store, {"rsi_buy": 25})
+    subs.add_coin(5, "BTCUSDT")
+    alerts = AlertEngine(store)
+    assert alerts.decide(9, "BTCUSDT", "1m", "BUY", 3, 600)
+    alerts.flush()
+
+    run(web_worker, path)
+
+    # stale until synced
+    assert subs.coins(5) == ["BTCUSDT"]
+    assert not alerts.decide(9, "BTCUSDT", "1m", "BUY", 3, 600)
+    assert subs.sync() and alerts.sync()
+    assert not subs.sync() and not alerts.sync()
+    assert subs.coins(5) == ["BTCUSDT", "ETHUSDT"]
+    assert subs.prefs(5)["rsi_buy"] == 30
+    assert ("SOLUSDT", "1m") in subs.pairs(["SOLUSDT"])
+    assert subs.chats_for("SOLUSDT", "1m") == [7]
+    # the reset in the other process cleared chat 9's cooldown here too
+    assert alerts.decide(9, "BTCUSDT", "1m", "BUY", 3, 600)
+
+def test_concurrent_updates_keep_every_write(tmp_path):
+    path = str(tmp_path / "state.db")
+    subs = Subscriptions(StateStore(path), {})
+    subs.add_coin(5, "BTCUSDT")
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=add_coins, args=(path, p, 25)) for p in "AB"]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+    subs.mute(5, "XRPUSDT")  # writes from a stale cache must not drop theirs
+    coins = Subscriptions(StateStore(path), {}).coins(5)
+    assert len(coins) == 51 and coins[0] == "BTCUSDT"